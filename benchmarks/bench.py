@@ -0,0 +1,181 @@
+"""Time sssg builds of a synthetic site and compare them against a stored baseline.
+
+Each build runs in its own process so peak memory can be measured. The cold build
+starts from an empty destination and cache, the warm build runs again on top of it.
+"""
+
+import argparse
+import json
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from sitegen import SiteShape, add_shape_arguments, generate_site
+
+REPO_DIR = Path(__file__).absolute().parent.parent
+# Use the checkout being benchmarked, like the builds do
+sys.path.insert(0, str(REPO_DIR))
+from sssg.watch import serve_directory  # noqa: E402
+
+# Runs a single build in a child process and reports on it as JSON
+BUILD_SCRIPT = """
+import json, resource, sys, time
+import sssg
+
+options = json.loads(sys.argv[3])
+start = time.perf_counter()
+sssg.process_directory(sys.argv[1], sys.argv[2], **options)
+seconds = time.perf_counter() - start
+
+usage = max(
+    resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+)
+# ru_maxrss is in bytes on macOS, kilobytes elsewhere
+peak_rss = usage if sys.platform == "darwin" else usage * 1024
+print(json.dumps({"seconds": seconds, "peak_rss": peak_rss}))
+"""
+
+
+def run_build(source: Path, dest: Path, options: dict[str, object]) -> dict:
+    """Build a site in a fresh interpreter, returning its time and peak memory."""
+    args = [str(source), str(dest), json.dumps(options)]
+    output = subprocess.check_output(
+        [sys.executable, "-c", BUILD_SCRIPT, *args], cwd=REPO_DIR, text=True
+    )
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def summarize(runs: list[dict], pages: int) -> dict:
+    seconds = statistics.median(r["seconds"] for r in runs)
+    return {
+        "seconds": seconds,
+        "pages_per_second": pages / seconds if seconds else 0,
+        "peak_rss": max(r["peak_rss"] for r in runs),
+        "runs": [r["seconds"] for r in runs],
+    }
+
+
+def run_benchmark(
+    work_dir: Path, shape: SiteShape, options: dict[str, object], repeat: int
+) -> dict:
+    """Generate a site, then time cold and warm builds of it.
+
+    Remote assets are downloaded from a local server, so cold builds download them
+    and warm builds revalidate them."""
+    source = work_dir / "site"
+    # On a free port, standing in for a remote server
+    server = serve_directory(source, 0)
+    try:
+        generate_site(source, shape, f"http://127.0.0.1:{server.server_port}")
+        return _run_builds(work_dir, source, shape, options, repeat)
+    finally:
+        server.shutdown()
+
+
+def _run_builds(
+    work_dir: Path,
+    source: Path,
+    shape: SiteShape,
+    options: dict[str, object],
+    repeat: int,
+) -> dict:
+    pages = shape.pages + shape.data_pages + 1
+
+    cold: list[dict] = []
+    warm: list[dict] = []
+    for _ in range(repeat):
+        dest = work_dir / "out"
+        cache = work_dir / "cache"
+        shutil.rmtree(dest, ignore_errors=True)
+        shutil.rmtree(cache, ignore_errors=True)
+
+        build_options = dict(options, cache_dir=str(cache))
+        cold.append(run_build(source, dest, build_options))
+        warm.append(run_build(source, dest, build_options))
+
+    return {
+        "shape": shape._asdict(),
+        "options": options,
+        "results": {"cold": summarize(cold, pages), "warm": summarize(warm, pages)},
+    }
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    """List the scenarios that got slower than the baseline allows."""
+    regressions = []
+    same_site = report.get("shape") == baseline.get("shape")
+    if not same_site or report["options"] != baseline.get("options"):
+        print("Warning: baseline was recorded with a different site or options.")
+
+    for name, result in report["results"].items():
+        previous = baseline.get("results", {}).get(name)
+        if previous is None:
+            continue
+        change = result["seconds"] / previous["seconds"] - 1
+        print(f"{name:>5}: {change:+.1%} against baseline")
+        if change > tolerance:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    add_shape_arguments(parser)
+    parser.add_argument("--jobs", type=int, default=1, help="Passed to sssg")
+    parser.add_argument("--incremental", action="store_true", help="Passed to sssg")
+    parser.add_argument(
+        "--sync-assets", choices=("mtime", "hash"), help="Passed to sssg"
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Builds per scenario")
+    parser.add_argument("--work-dir", help="Keep the generated site here")
+    parser.add_argument("--output", help="Save the results to this file as JSON")
+    parser.add_argument("--baseline", help="Compare against results saved earlier")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.1,
+        help="Allowed slowdown against the baseline (0.1 is 10%%)",
+    )
+    args = parser.parse_args()
+
+    shape = SiteShape(**{f: getattr(args, f) for f in SiteShape._fields})
+    options = {
+        "jobs": args.jobs,
+        "incremental": args.incremental,
+        "sync_assets": args.sync_assets,
+    }
+
+    if args.work_dir:
+        work_dir = Path(args.work_dir).absolute()
+        shutil.rmtree(work_dir, ignore_errors=True)
+        work_dir.mkdir(parents=True)
+        report = run_benchmark(work_dir, shape, options, args.repeat)
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            report = run_benchmark(Path(tmp), shape, options, args.repeat)
+
+    for name, result in report["results"].items():
+        print(
+            f"{name:>5}: {result['seconds']:.2f}s, "
+            f"{result['pages_per_second']:.0f} pages/s, "
+            f"peak RSS {result['peak_rss'] / 1024 / 1024:.0f} MB"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print("Regressed:", ", ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
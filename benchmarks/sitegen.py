@@ -0,0 +1,193 @@
+"""Generate synthetic SSSG sites of a configurable size and shape for benchmarking."""
+
+import argparse
+import json
+import random
+from pathlib import Path
+from typing import NamedTuple
+
+WORDS = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+    "incididunt ut labore et dolore magna aliqua enim ad minim veniam quis nostrud "
+    "exercitation ullamco laboris nisi aliquip ex ea commodo consequat"
+).split()
+
+
+class SiteShape(NamedTuple):
+    """How big a synthetic site is, and what it's made of."""
+
+    pages: int = 1000
+    sections: int = 20
+    template_depth: int = 4
+    links_per_page: int = 10
+    data_pages: int = 20
+    data_items: int = 500
+    assets: int = 10
+    asset_size: int = 1024 * 1024
+    remote_assets: int = 0
+    seed: int = 0
+
+
+def _sentence(rng: random.Random, words: int = 12) -> str:
+    text = " ".join(rng.choice(WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + "."
+
+
+def _write(path: Path, content: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+
+def _write_templates(dest: Path, shape: SiteShape) -> str:
+    """Write a chain of layouts extending each other, returning the deepest one."""
+
+    templates = dest / ".templates"
+    _write(
+        templates / "level0.html",
+        "<!doctype html>\n<html><head><title>{{ title }}</title>"
+        "{% block head %}{% endblock %}</head>\n"
+        "<body>{% block nav %}<nav>{% include 'nav.html' %}</nav>{% endblock %}\n"
+        "<main>{% block content %}{% endblock %}</main></body></html>\n",
+    )
+    _write(
+        templates / "nav.html",
+        '{% for i in range(10) %}<a href="{{ path_to_root }}s{{ i }}/">{{ i }}</a>'
+        "{% endfor %}\n",
+    )
+
+    for level in range(1, shape.template_depth + 1):
+        _write(
+            templates / f"level{level}.html",
+            f'{{% extends "level{level - 1}.html" %}}\n'
+            "{% block content %}"
+            f'<div class="level{level}">{{{{ super() }}}}'
+            + ("{{ md_content | markdown }}" if level == shape.template_depth else "")
+            + "</div>{% endblock %}\n",
+        )
+
+    return f"level{shape.template_depth}"
+
+
+def _page_path(shape: SiteShape, index: int) -> str:
+    return f"s{index % shape.sections}/page{index}.md"
+
+
+def _write_pages(dest: Path, shape: SiteShape, layout: str, rng: random.Random):
+    for index in range(shape.pages):
+        path = _page_path(shape, index)
+
+        links = []
+        for _ in range(shape.links_per_page):
+            target = _page_path(shape, rng.randrange(shape.pages))
+            links.append(f"[{rng.choice(WORDS)}](../{target})")
+
+        body = [
+            f"# Page {index}",
+            "",
+            _sentence(rng, 30),
+            "",
+            "- " + _sentence(rng),
+            "- " + _sentence(rng),
+            "- [x] " + _sentence(rng, 4),
+            "",
+            "| a | b | c |",
+            "|---|---|---|",
+            "| 1 | *2* | ~~3~~ |",
+            "",
+            "```python",
+            f"print({index})",
+            "```",
+            "",
+            " ".join(links),
+            "",
+            _sentence(rng, 40) + " :smile:",
+        ]
+
+        _write(
+            dest / path,
+            "---\n"
+            f"title: Page {index}\n"
+            f"template_name: {layout}\n"
+            f"date: 2024-01-{index % 28 + 1:02d}\n"
+            f"tags: [{rng.choice(WORDS)}, {rng.choice(WORDS)}]\n"
+            "---\n" + "\n".join(body) + "\n",
+        )
+
+
+def _write_data_pages(dest: Path, shape: SiteShape, rng: random.Random):
+    for index in range(shape.data_pages):
+        items = [
+            {"id": i, "name": _sentence(rng, 3), "price": rng.randrange(10000) / 100}
+            for i in range(shape.data_items)
+        ]
+        _write(dest / "data" / f"catalog{index}.json", json.dumps({"items": items}))
+        _write(
+            dest / "catalog" / f"catalog{index}.html.j2",
+            "---\n"
+            f"load_json: ../data/catalog{index}.json\n"
+            f"title: Catalog {index}\n"
+            "---\n"
+            '{% extends "level0.html" %}{% block content %}<table>'
+            "{% for item in items %}<tr><td>{{ item.id }}</td>"
+            "<td>{{ item.name }}</td><td>{{ item.price }}</td></tr>"
+            "{% endfor %}</table>{% endblock %}\n",
+        )
+
+
+def _write_assets(dest: Path, shape: SiteShape, rng: random.Random):
+    assets = dest / "assets"
+    assets.mkdir(parents=True, exist_ok=True)
+    for index in range(shape.assets):
+        with open(assets / f"blob{index}.bin", "wb") as f:
+            f.write(rng.randbytes(shape.asset_size))
+
+
+def _write_remote_assets(dest: Path, shape: SiteShape, remote_url: str):
+    # More targets than assets share URLs, like a site linking one file twice
+    for index in range(shape.remote_assets if shape.assets else 0):
+        _write(
+            dest / "remote" / f"file{index}.bin.sssg-copy",
+            f"{remote_url}/assets/blob{index % shape.assets}.bin",
+        )
+
+
+def generate_site(
+    dest: Path,
+    shape: SiteShape = SiteShape(),
+    remote_url: str = "http://127.0.0.1:8000",
+) -> None:
+    """Write a synthetic site to dest. The same shape always gives the same site.
+
+    Remote assets download the site's own assets from remote_url, which should serve
+    the site directory."""
+
+    rng = random.Random(shape.seed)
+    layout = _write_templates(dest, shape)
+    _write_pages(dest, shape, layout, rng)
+    _write_data_pages(dest, shape, rng)
+    _write_assets(dest, shape, rng)
+    _write_remote_assets(dest, shape, remote_url)
+    _write(dest / "index.md", f"---\ntemplate_name: {layout}\n---\n# Index\n")
+
+
+def add_shape_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add options for every field of SiteShape."""
+    for field, default in SiteShape._field_defaults.items():
+        parser.add_argument(
+            "--" + field.replace("_", "-"), type=int, default=default, dest=field
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("destination", help="Directory to write the site to")
+    add_shape_arguments(parser)
+    args = parser.parse_args()
+
+    shape = SiteShape(**{f: getattr(args, f) for f in SiteShape._fields})
+    generate_site(Path(args.destination), shape)
+
+
+if __name__ == "__main__":
+    main()
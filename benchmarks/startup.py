@@ -0,0 +1,80 @@
+"""Time how long sssg takes to start, and compare it against a stored baseline.
+
+Runs `sssg --help` and a build of an empty site, each in a fresh interpreter, so
+the time is mostly spent importing modules and setting up before any page.
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from bench import REPO_DIR, compare
+
+
+def time_command(args: list[str], repeat: int) -> dict:
+    """Run sssg in a fresh interpreter several times, returning the wall times."""
+    runs: list[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-m", "sssg", *args],
+            cwd=REPO_DIR,
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+        runs.append(time.perf_counter() - start)
+    return {"seconds": statistics.median(runs), "runs": runs}
+
+
+def run_benchmark(work_dir: Path, repeat: int) -> dict:
+    source = work_dir / "empty"
+    source.mkdir()
+    dest = work_dir / "out"
+
+    return {
+        "options": {},
+        "results": {
+            "help": time_command(["--help"], repeat),
+            "empty": time_command([str(source), str(dest)], repeat),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=10, help="Runs per scenario")
+    parser.add_argument("--output", help="Save the results to this file as JSON")
+    parser.add_argument("--baseline", help="Compare against results saved earlier")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Allowed slowdown against the baseline (0.2 is 20%%)",
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        report = run_benchmark(Path(tmp), args.repeat)
+
+    for name, result in report["results"].items():
+        print(f"{name:>5}: {result['seconds'] * 1000:.0f}ms")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print("Regressed:", ", ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
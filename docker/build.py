@@ -1,5 +1,6 @@
 import os
 import sssg
+from sssg.shard import merge_shards, parse_shard
 
 input_dir = "./"
 if 'INPUT_SOURCE' in os.environ and len(os.environ['INPUT_SOURCE']):
@@ -17,6 +18,14 @@ ignore_paths = None
 if 'INPUT_IGNORE' in os.environ and len(os.environ['INPUT_IGNORE']) > 0:
     ignore_paths = os.environ['INPUT_IGNORE'].split(',')
 
+shard = None
+if 'INPUT_SHARD' in os.environ and len(os.environ['INPUT_SHARD']) > 0:
+    shard = parse_shard(os.environ['INPUT_SHARD'])
+
+merge = None
+if 'INPUT_MERGE' in os.environ and len(os.environ['INPUT_MERGE']) > 0:
+    merge = os.environ['INPUT_MERGE'].split(',')
+
 debug = False
 if 'SSSG_DEBUG' in os.environ and os.environ['SSSG_DEBUG'] == 'true':
     print("Starting SSSG action.")
@@ -25,7 +34,21 @@ if 'SSSG_DEBUG' in os.environ and os.environ['SSSG_DEBUG'] == 'true':
     print("Target:", target_dir)
     print("Files as dirs?", files_as_dirs)
     print("Ignore paths:", ignore_paths)
+    print("Shard:", shard)
+    print("Merge:", merge)
 
-print("Processing data...")
-sssg.process_directory(input_dir, target_dir, files_as_dirs=files_as_dirs, ignore_paths=ignore_paths, debug=debug)
-print("Done.")
+if merge:
+    print("Merging shards...")
+    merge_shards(merge, target_dir)
+    print("Done.")
+else:
+    print("Processing data...")
+    sssg.process_directory(
+        input_dir,
+        target_dir,
+        files_as_dirs=files_as_dirs,
+        ignore_paths=ignore_paths,
+        debug=debug,
+        shard=shard,
+    )
+    print("Done.")
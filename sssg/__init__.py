@@ -1,41 +1,118 @@
+import json
+import os
+import posixpath
 import shutil
+from concurrent.futures import Future
+from functools import partial
 from pathlib import Path
-from typing import Optional
-from urllib import parse, request
-from .templater import Templater
-from .util import restructure_file_as_dir, find_files, BuildError
+from typing import TYPE_CHECKING, Optional
+from urllib import parse
+from .assets import AssetCopier
+from .compress import (
+    COMPRESS_STATE_FILENAME,
+    DEFAULT_COMPRESS_MIN_SIZE,
+    Precompressor,
+    gzip_sibling,
+    is_compressible,
+)
+from .deploy import DeployManifest, prune_outputs
+from .fingerprint import FINGERPRINT_STATE_FILENAME, HashCache, fingerprint_plan
+from .manifest import MANIFEST_FILENAME, BuildManifest
+from .metadata import parse_frontmatter
+from .plan import BuildPlan, PlanEntry, plan_build, plan_file
+from .profiling import BuildProfiler, timed_phase
+from .remote import (
+    DEFAULT_FETCH_JOBS,
+    DEFAULT_FETCH_TIMEOUT,
+    RemoteFetcher,
+    download_to_sink,
+)
+from .shard import SHARD_MANIFEST_FILENAME, shard_plan, write_shard_manifest
+from .search import SEARCH_STATE_FILENAME, SearchIndex
+from .site import SITE_STATE_FILENAME, PageIndexCache, index_pages, page_url
+from .sinks import DirectorySink, OutputSink
+from .util import (
+    hash_bytes,
+    SourceIndex,
+    BuildError,
+)
+from .workers import PageTask, PageResult, build_page, build_page_in_worker, init_worker
+
+# Importable from the package since before the build was split into modules
+from .util import find_files, restructure_file_as_dir  # noqa: F401
+
+if TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor
+    from .templater import Templater
+
+
+def __getattr__(name: str) -> object:
+    # Jinja and Markdown are slow to import, so the templater only loads when used
+    if name == "Templater":
+        from .templater import Templater
+
+        return Templater
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _sink_for(
+    dest_filename: Path, sink: Optional[OutputSink]
+) -> tuple[OutputSink, str]:
+    """Get the sink and path within it for an output, a real file if no sink."""
+    if sink is None:
+        return (DirectorySink(Path(dest_filename).parent), Path(dest_filename).name)
+    return (sink, Path(dest_filename).as_posix())
 
 
 def process_template(
-    tmpl: Templater, source_filename: Path, dest_filename: Path, **kwargs
+    tmpl: "Templater",
+    source_filename: Path,
+    dest_filename: Path,
+    sink: Optional[OutputSink] = None,
+    **kwargs,
 ) -> None:
-    """Read a source file and save the template output."""
+    """Read a source file and save the template output.
+
+    With a sink, dest_filename is the path within it."""
 
     with open(source_filename, "r", encoding="utf-8") as f:
         content = f.read()
 
-    output = tmpl.generate_html(content, source_filename, dest_filename, **kwargs)
-
-    with open(dest_filename, "w", encoding="utf-8") as f:
-        f.write(output)
+    chunks = tmpl.stream_html(content, source_filename, dest_filename, **kwargs)
+    (sink, rel_path) = _sink_for(dest_filename, sink)
+    sink.write_chunks(rel_path, chunks)
 
 
 def process_md_template(
-    tmpl: Templater, source_filename: Path, dest_filename: Path, **kwargs
+    tmpl: "Templater",
+    source_filename: Path,
+    dest_filename: Path,
+    sink: Optional[OutputSink] = None,
+    **kwargs,
 ) -> None:
-    """Read a Markdown file and save the template output."""
+    """Read a Markdown file and save the template output.
+
+    With a sink, dest_filename is the path within it."""
 
     with open(source_filename, "r", encoding="utf-8") as f:
         content = f.read()
 
-    output = tmpl.generate_markdown(content, source_filename, dest_filename, **kwargs)
+    chunks = tmpl.stream_markdown(content, source_filename, dest_filename, **kwargs)
+    (sink, rel_path) = _sink_for(dest_filename, sink)
+    sink.write_chunks(rel_path, chunks)
 
-    with open(dest_filename, "w", encoding="utf-8") as f:
-        f.write(output)
 
+def process_copy_operation(
+    source_filename: Path,
+    dest_filename: Path,
+    fetcher: Optional[RemoteFetcher] = None,
+    rel_path: str = "",
+    sink: Optional[OutputSink] = None,
+) -> None:
+    """Parse a SSSG-COPY file and save the target to the destination.
 
-def process_copy_operation(source_filename: Path, dest_filename: Path) -> None:
-    """Parse a SSSG-COPY file and save the target to the destination."""
+    Remote targets are fetched in the background if a fetcher is given. With a sink,
+    dest_filename is the path within it."""
 
     with open(source_filename, "r", encoding="utf-8") as f:
         target_url = f.read()
@@ -44,19 +121,97 @@ def process_copy_operation(source_filename: Path, dest_filename: Path) -> None:
         return
 
     (scheme, _, _, _, _, _) = parse.urlparse(target_url)
+    (sink, dest_rel) = _sink_for(dest_filename, sink)
 
     if not scheme:
         # Probably a local path, relative or otherwise
         abs_target = Path(target_url)
         if not abs_target.is_absolute():
             abs_target = (Path(source_filename).parent / target_url).resolve()
-        if abs_target.exists():
-            shutil.copy2(abs_target, dest_filename)
-        else:
+        if not abs_target.exists():
             raise BuildError(f"Unable to find source file {target_url}")
-    else:
+        sink.copy_file(dest_rel, abs_target)
+    elif fetcher is not None:
         # Save the URL to a file
-        request.urlretrieve(target_url, dest_filename)
+        fetcher.fetch(target_url, Path(dest_rel), rel_path, sink)
+    else:
+        download_to_sink(target_url, sink, dest_rel)
+
+
+def process_file(
+    source_path: Path,
+    dest_path: Path,
+    curr_src_file: Path,
+    files_as_dirs: bool,
+    source_stat: Optional[os.stat_result] = None,
+    fetcher: Optional[RemoteFetcher] = None,
+    profiler: Optional[BuildProfiler] = None,
+    sink: Optional[OutputSink] = None,
+) -> Optional[PageTask]:
+    """Process a single source file.
+
+    Static files are copied (through fetcher if given), pages are returned as a
+    task to render. If sink is given, output goes through it instead of to
+    dest_path."""
+
+    entry = plan_file(source_path, dest_path, curr_src_file, files_as_dirs, source_stat)
+    if sink is None:
+        sink = DirectorySink(dest_path)
+    return process_entry(entry, sink, fetcher, profiler)
+
+
+def process_entry(
+    entry: PlanEntry,
+    sink: OutputSink,
+    fetcher: Optional[RemoteFetcher] = None,
+    profiler: Optional[BuildProfiler] = None,
+) -> Optional[PageTask]:
+    """Carry out a planned source file like process_file."""
+
+    if entry.is_page:
+        return PageTask(
+            entry.source,
+            entry.dest,
+            entry.dest_rel,
+            entry.rel_path,
+            entry.path_to_root,
+            entry.kind == "markdown",
+        )
+
+    try:
+        if entry.kind == "copy":
+            # Copy softlinks
+            with timed_phase(profiler, entry.rel_path, "copy"):
+                process_copy_operation(
+                    entry.source, Path(entry.dest_rel), fetcher, entry.rel_path, sink
+                )
+        else:
+            # Copy everything else, in the background with a directory sink's copier
+            nbytes = entry.stat.st_size if entry.stat is not None else 0
+            with timed_phase(profiler, entry.rel_path, "copy", nbytes):
+                sink.copy_file(entry.dest_rel, entry.source, entry.stat)
+    except Exception as err:
+        raise BuildError(
+            f"Failed file copy: /{entry.rel_path}, got error: {err}"
+        ) from err
+
+    return None
+
+
+def write_link_report(
+    report_filename: Path, broken_links: dict[str, list[str]]
+) -> None:
+    """Save the broken Markdown links found in each page as JSON."""
+
+    report = {
+        "broken_links": [
+            {"source": rel_path, "href": href}
+            for (rel_path, hrefs) in broken_links.items()
+            for href in hrefs
+        ]
+    }
+    with open(report_filename, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
 
 
 def process_directory(
@@ -66,88 +221,363 @@ def process_directory(
     wipe_first: bool = False,
     ignore_paths: Optional[list[str]] = None,
     debug: bool = False,
+    incremental: bool = False,
+    jobs: int = 1,
+    cache_dir: Optional[str] = None,
+    link_report: Optional[str] = None,
+    sync_assets: Optional[str] = None,
+    link_assets: Optional[str] = None,
+    fetch_jobs: int = DEFAULT_FETCH_JOBS,
+    fetch_timeout: float = DEFAULT_FETCH_TIMEOUT,
+    offline: bool = False,
+    profile: Optional[str] = None,
+    deploy_manifest: Optional[str] = None,
+    prune: bool = False,
+    plan: Optional[BuildPlan] = None,
+    shard: Optional[tuple[int, int]] = None,
+    shard_timings: Optional[dict[str, float]] = None,
+    precompress: bool = False,
+    precompress_min_size: int = DEFAULT_COMPRESS_MIN_SIZE,
+    sink: Optional[OutputSink] = None,
+    fingerprint: Optional[list[str]] = None,
+    search_index: Optional[str] = None,
 ) -> None:
-    """Process a source directory and save results to destination."""
+    """Process a source directory and save results to destination.
+
+    If incremental is set, pages whose source, templates and data are unchanged
+    since the last incremental build are skipped.
+    If jobs is more than 1, pages are rendered in that many worker processes
+    (0 uses one per CPU).
+    If cache_dir is set, compiled templates, converted Markdown and remote
+    .sssg-copy targets are kept there between builds.
+    If link_report is set, broken Markdown links are saved there as JSON instead of
+    being printed.
+    Static files are copied in the background. sync_assets ("mtime" or "hash") skips
+    files already in the destination, link_assets ("hardlink" or "reflink") links
+    them instead of copying where the filesystem allows it.
+    Remote .sssg-copy targets are fetched fetch_jobs at a time, failing if the
+    server sends nothing for fetch_timeout seconds. If offline is set, they only
+    come from the cache.
+    If profile is set, the time spent on each file in each phase of the build is
+    saved there as JSON, and the slowest files are printed.
+    Pages are only written when their output changes. If deploy_manifest is set, the
+    content hash of every output and which ones changed since the last build with
+    the same deploy_manifest are saved there as JSON.
+    If prune is set, files in the destination that no source file maps to are
+    deleted before building, along with empty directories, instead of wiping it.
+    If plan is given (from plan_build), it's used instead of walking the source
+    again.
+    If shard is set to (K, N), only the Kth of N balanced parts of the site is built,
+    along with a list of its outputs for merge_shards. Pages are balanced by
+    shard_timings (seconds per source path, see load_timings) if given, otherwise
+    by size.
+    If precompress is set, HTML, CSS, JS, SVG and JSON outputs of at least
+    precompress_min_size bytes get a gzipped copy next to them, compressed in the
+    background and only when their contents changed.
+    If sink is given, output goes through it instead of to dest_dir, which then only
+    names the destination. Sinks that aren't a directory (like TarSink) can't be
+    combined with options that need the last build's output: wipe_first,
+    incremental, sync_assets, link_assets, deploy_manifest, prune, shard and
+    precompress.
+    If fingerprint is set to gitignore style globs, matching static files are saved
+    as name.<hash>.ext instead. The asset_url filter and Markdown links use the new
+    names. Hashes are reused while a file's size and mtime match, kept in cache_dir
+    if set or otherwise the destination.
+    Templates can list every page with site.pages, read from the frontmatter of
+    every page the first time a template uses it. The frontmatter is kept in
+    cache_dir if set, or the destination for incremental builds, and reused while
+    a page's size and mtime match.
+    If search_index is set to a directory within the destination, the words of
+    Markdown pages and their titles are saved there as an inverted index, sharded
+    by word prefix. The words are kept in cache_dir if set, or the destination for
+    incremental builds, so only changed pages and shards are redone."""
 
     # Validate source directory
     source_path = Path(source_dir).absolute()
     if not source_path.exists():
         raise FileNotFoundError("Source directory does not exist.")
 
-    # Find all files in source
-    contents = find_files(source_path, ignore_paths)
+    profiler: Optional[BuildProfiler] = None
+    if profile:
+        profiler = BuildProfiler()
 
-    # Handle destination directory
+    # Find all files in source and where they go
     dest_path = Path(dest_dir).absolute()
-    if wipe_first and dest_path.is_dir():
-        shutil.rmtree(dest_path)
-
-    # Prepare templater
-    tmpl = Templater(source_path, files_as_dirs)
+    if plan is None:
+        with timed_phase(profiler, "", "walk"):
+            plan = plan_build(source_path, dest_path, files_as_dirs, ignore_paths)
+    elif (plan.source_dir, plan.dest_dir) != (source_path, dest_path):
+        raise BuildError("Build plan is for a different source or destination")
+    source_index = SourceIndex(source_path, (e.source for e in plan.entries))
 
-    # Copy to output directory
-    for curr_src_file in contents:
-        # Get the target path
-        pp = curr_src_file.parts[len(source_path.parts) :]
-        curr_dest_file = Path(dest_path, *pp)
-
-        # Make sure it exists
-        curr_dest_dir = curr_dest_file.parent
-        if not curr_dest_dir.is_dir():
-            curr_dest_dir.mkdir(parents=True, exist_ok=True)
+    # Handle destination directory
+    if sink is None:
+        sink = DirectorySink(dest_path)
+    local_dest = sink.local_path("")
+    if local_dest is None:
+        for option, value in (
+            ("wipe_first", wipe_first),
+            ("incremental", incremental),
+            ("sync_assets", sync_assets),
+            ("link_assets", link_assets),
+            ("deploy_manifest", deploy_manifest),
+            ("prune", prune),
+            ("shard", shard),
+            ("precompress", precompress),
+        ):
+            if value:
+                raise ValueError(f"{option} needs a directory destination")
+    elif local_dest != dest_path:
+        raise ValueError("Directory sink is for a different destination")
+    if search_index and shard is not None:
+        # Each shard would only index its own pages
+        raise ValueError("search_index can't be combined with shard")
+    if search_index:
+        search_index = posixpath.normpath(search_index.strip("/"))
+        if search_index == "." or search_index.split("/")[0] == "..":
+            raise ValueError("search_index must be a directory within the destination")
+    cache_path = Path(cache_dir).absolute() if cache_dir else None
+
+    # Rename static files by content before anything links to them
+    fingerprints: dict[str, str] = {}
+    hashes: Optional[HashCache] = None
+    if fingerprint:
+        hashes = HashCache(
+            cache_path / "fingerprints.json"
+            if cache_path is not None
+            else (dest_path / FINGERPRINT_STATE_FILENAME if local_dest else None)
+        )
+        (plan, fingerprints) = fingerprint_plan(plan, fingerprint, hashes, profiler)
+
+    # Every page is in site.pages, even when only building a shard. The frontmatter
+    # of every page is only read once a template uses it
+    page_cache = PageIndexCache(
+        cache_path / "site.json"
+        if cache_path is not None
+        else (dest_path / SITE_STATE_FILENAME if incremental else None)
+    )
+    load_pages = partial(index_pages, plan, parse_frontmatter, page_cache)
+
+    if shard is not None:
+        # Links still resolve against the whole site
+        plan = shard_plan(plan, shard[0], shard[1], shard_timings)
 
+    if wipe_first and dest_path.is_dir():
+        shutil.rmtree(dest_path)
+    elif prune and dest_path.is_dir():
+        expected = plan.outputs()
+        expected.add(dest_path / MANIFEST_FILENAME)
+        expected.add(dest_path / SHARD_MANIFEST_FILENAME)
+        if fingerprint:
+            expected.add(dest_path / FINGERPRINT_STATE_FILENAME)
+        if incremental:
+            expected.add(dest_path / SITE_STATE_FILENAME)
+            expected.add(dest_path / SEARCH_STATE_FILENAME)
+        if precompress:
+            expected.add(dest_path / COMPRESS_STATE_FILENAME)
+            expected.update([gzip_sibling(p) for p in expected if is_compressible(p)])
+        if deploy_manifest:
+            expected.add(Path(deploy_manifest).absolute())
+        with timed_phase(profiler, "", "prune"):
+            keep_dirs = [source_path] + ([cache_path] if cache_path else [])
+            if search_index:
+                # Stale shards are deleted when the index is written
+                keep_dirs.append(dest_path / search_index)
+            removed = prune_outputs(dest_path, expected, keep_dirs)
         if debug:
-            print(f" > {curr_src_file}")
-
-        if curr_src_file.suffix == ".j2" or curr_src_file.suffix == ".md":
-            # Run anything ending in .j2 as a template
-            # Assume .md files are templates so they get turned into HTML
-
-            curr_dest_path_pure = curr_dest_file.with_suffix("")
-            ptr_height = len(pp)
-
-            if ".md" in curr_src_file.suffixes:
-                # Process Markdown template
-                curr_dest_path_pure = curr_dest_path_pure.with_suffix(".html")
-                (curr_dest_path_pure, ptr) = restructure_file_as_dir(
-                    files_as_dirs, curr_dest_path_pure, ptr_height
+            for rel_path in removed:
+                print(f" > Removed {rel_path}")
+
+    search: Optional[SearchIndex] = None
+    if search_index:
+        search = SearchIndex(
+            cache_path / "search.json"
+            if cache_path is not None
+            else (dest_path / SEARCH_STATE_FILENAME if incremental else None)
+        )
+
+    # Prepare templater, Jinja and Markdown are only loaded if there are pages
+    tmpl: Optional["Templater"] = None
+    if plan.pages():
+        from .templater import Templater
+
+        tmpl = Templater(source_path, files_as_dirs, cache_path)
+        tmpl.link_rewriter.set_source_index(source_index)
+        tmpl.fingerprints.update(fingerprints)
+        tmpl.site.update(partial(load_pages, profiler=profiler))
+        tmpl.timer.enabled = profiler is not None
+        tmpl.collect_search = search is not None
+
+    manifest: Optional[BuildManifest] = None
+    if incremental:
+        manifest = BuildManifest.load(dest_path, {"files_as_dirs": files_as_dirs})
+    seen_pages: set[str] = set()
+    source_hashes: dict[str, str] = {}
+    broken_links: dict[str, list[str]] = {}
+
+    def save_page(task: PageTask, result: PageResult) -> None:
+        if result.output is not None:
+            with timed_phase(profiler, task.rel_path, "write", len(result.output)):
+                sink.write_bytes(task.dest_rel, result.output.encode("utf-8"))
+        if compressor is not None:
+            compressor.compress(task.dest, task.rel_path)
+        if profiler is not None:
+            profiler.add_timings(task.rel_path, result.timings)
+        if result.broken_links:
+            broken_links[task.rel_path] = result.broken_links
+        if search is not None and result.search is not None:
+            search.add(
+                task.rel_path, page_url(task.dest_rel, files_as_dirs), result.search
+            )
+        elif search is not None:
+            search.discard(task.rel_path)
+        if manifest is not None:
+            manifest.record(
+                task.rel_path, source_hashes[task.rel_path], task.dest, tmpl, result
+            )
+
+    # Render pages in worker processes if requested
+    pool: Optional[ProcessPoolExecutor] = None
+    pending: list[tuple[PageTask, Future[PageResult]]] = []
+    if jobs != 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        pool = ProcessPoolExecutor(
+            max_workers=jobs or None,
+            initializer=init_worker,
+            initargs=(
+                source_path,
+                files_as_dirs,
+                cache_path,
+                source_index,
+                profiler is not None,
+                fingerprints,
+                load_pages,
+                search is not None,
+            ),
+        )
+
+    copier = AssetCopier(sync_assets, link_assets, profiler=profiler)
+    if isinstance(sink, DirectorySink):
+        # Static files are synced and linked in the background
+        sink = sink.with_copier(copier)
+    fetcher = RemoteFetcher(
+        cache_path / "downloads" if cache_path else None,
+        fetch_jobs,
+        offline,
+        profiler,
+        fetch_timeout,
+    )
+    compressor: Optional[Precompressor] = None
+    if precompress:
+        compressor = Precompressor(dest_path, precompress_min_size, profiler=profiler)
+
+    try:
+        # Copy to output directory
+        for entry in plan.entries:
+            if debug:
+                print(f" > {entry.source}")
+
+            task = process_entry(entry, sink, fetcher, profiler)
+            if task is None:
+                continue
+
+            if manifest is not None:
+                seen_pages.add(task.rel_path)
+                with open(entry.source, "rb") as f:
+                    source_hashes[task.rel_path] = hash_bytes(f.read())
+                # Redirects have nothing to search
+                previous_meta = manifest.pages.get(task.rel_path, {}).get("meta", {})
+                unindexed = (
+                    search is not None
+                    and task.is_markdown
+                    and not search.has(task.rel_path)
+                    and "redirect_url" not in previous_meta
                 )
-
-                try:
-                    process_md_template(
-                        tmpl, curr_src_file, curr_dest_path_pure, path_to_root=ptr
-                    )
-                except Exception as err:
-                    raise BuildError(
-                        f"Failed processing markdown file: /{'/'.join(pp)}, got error: {err}"
-                    ) from err
-            else:
-                # Process default template
-                (curr_dest_path_pure, ptr) = restructure_file_as_dir(
-                    files_as_dirs, curr_dest_path_pure, ptr_height
+                if not unindexed and manifest.is_fresh(
+                    task.rel_path, source_hashes[task.rel_path], tmpl
+                ):
+                    # Nothing this page depends on has changed
+                    previous = manifest.pages[task.rel_path]
+                    if previous["broken_links"]:
+                        broken_links[task.rel_path] = previous["broken_links"]
+                    if compressor is not None:
+                        compressor.compress(task.dest, task.rel_path)
+                    continue
+
+            if pool is not None:
+                # Only directories can be written to from other processes
+                future = pool.submit(
+                    build_page_in_worker,
+                    task,
+                    manifest is not None,
+                    sink if local_dest is not None else None,
                 )
-
-                try:
-                    process_template(
-                        tmpl, curr_src_file, curr_dest_path_pure, path_to_root=ptr
-                    )
-                except Exception as err:
-                    raise BuildError(
-                        f"Failed processing template file: /{'/'.join(pp)}, got error: {err}"
-                    ) from err
-        elif curr_src_file.suffix == ".sssg-copy":
-            # Copy softlinks
-
-            curr_dest_path_pure = curr_dest_file.with_suffix("")
-
-            try:
-                process_copy_operation(curr_src_file, curr_dest_path_pure)
-            except Exception as err:
-                raise BuildError(
-                    f"Failed file copy: /{'/'.join(pp)}, got error: {err}"
-                ) from err
-
-        else:
-            # Copy everything else
-
-            shutil.copy2(curr_src_file, curr_dest_file)
+                pending.append((task, future))
+            else:
+                save_page(task, build_page(tmpl, task, manifest is not None, sink))
+
+        # Save pages from the workers in source order
+        for task, future in pending:
+            save_page(task, future.result())
+        fetcher.wait()
+        copier.wait()
+
+        search_outputs: list[str] = []
+        if search is not None:
+            search.prune({e.rel_path for e in plan.pages()})
+            with timed_phase(profiler, "", "search"):
+                search_outputs = search.write(sink, search_index)
+
+        if compressor is not None:
+            # Static files are only all there once copied
+            for entry in plan.entries:
+                if not entry.is_page and entry.dest.is_file():
+                    compressor.compress(entry.dest, entry.rel_path)
+            for rel_path in search_outputs:
+                compressor.compress(dest_path / rel_path, rel_path)
+            compressor.wait()
+            compressor.save()
+    finally:
+        copier.close()
+        fetcher.close()
+        if compressor is not None:
+            compressor.close()
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    if manifest is not None:
+        manifest.prune(seen_pages)
+        manifest.save()
+
+    if hashes is not None:
+        hashes.save()
+    if page_cache.entries:
+        # Otherwise nothing used site.pages, keep what the last build found
+        page_cache.save()
+    if search is not None:
+        search.save()
+
+    if shard is not None:
+        write_shard_manifest(plan, shard[0], shard[1])
+
+    if tmpl is not None:
+        if tmpl.template_cache is not None:
+            tmpl.template_cache.prune()
+        tmpl.markdown_cache.prune()
+
+    if deploy_manifest:
+        deploy = DeployManifest(Path(deploy_manifest).absolute())
+        with timed_phase(profiler, "", "deploy"):
+            deploy.scan(dest_path)
+        deploy.save()
+
+    if profile and profiler is not None:
+        profiler.write_report(Path(profile))
+
+    if link_report:
+        write_link_report(Path(link_report), broken_links)
+    else:
+        for rel_path, hrefs in broken_links.items():
+            for href in hrefs:
+                print(" > In", source_path / rel_path, "link to", href, "not found.")
@@ -1,10 +1,22 @@
 import argparse
+import json
+import sys
+from pathlib import Path
 from . import process_directory
+from .assets import LINK_MODES, SYNC_MODES
+from .compress import DEFAULT_COMPRESS_MIN_SIZE
+from .manifest import BuildManifest
+from .plan import plan_build
+from .remote import DEFAULT_FETCH_JOBS, DEFAULT_FETCH_TIMEOUT
+from .shard import load_timings, merge_shards, parse_shard
+from .sinks import open_archive_sink
 
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument("source", help="Source directory")
+    parser.add_argument(
+        "source", nargs="?", help="Source directory (left out with --merge)"
+    )
     parser.add_argument("destination", help="Destination directory")
     parser.add_argument(
         "-d",
@@ -12,6 +24,11 @@ def main():
         action="store_true",
         help="Delete contents of destination directory before copying",
     )
+    parser.add_argument(
+        "--prune",
+        action="store_true",
+        help="Delete outputs of files no longer in the source instead of everything",
+    )
     parser.add_argument(
         "--files-as-dirs",
         action="store_true",
@@ -23,23 +40,255 @@ def main():
         action="store",
         help="Ignore glob (gitignore style, comma seperated)",
     )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only rebuild pages whose source, templates or data changed",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        action="store",
+        type=int,
+        default=1,
+        help="Number of processes to render pages with (0 for one per CPU)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        action="store",
+        help="Directory to keep compiled templates, Markdown and downloads in",
+    )
+    parser.add_argument(
+        "--link-report",
+        action="store",
+        help="Save broken Markdown links to this file as JSON",
+    )
+    parser.add_argument(
+        "--sync-assets",
+        action="store",
+        choices=SYNC_MODES,
+        help="Skip static files already in the destination, by size and mtime or hash",
+    )
+    parser.add_argument(
+        "--link-assets",
+        action="store",
+        choices=LINK_MODES,
+        help="Hardlink or copy-on-write clone static files instead of copying them",
+    )
+    parser.add_argument(
+        "--fetch-jobs",
+        action="store",
+        type=int,
+        default=DEFAULT_FETCH_JOBS,
+        help="Number of remote .sssg-copy targets to download at once",
+    )
+    parser.add_argument(
+        "--fetch-timeout",
+        action="store",
+        type=float,
+        default=DEFAULT_FETCH_TIMEOUT,
+        help="Seconds to wait on a server that stops sending before failing",
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Only use remote .sssg-copy targets already in the cache directory",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store",
+        help="Save the time spent on each file and phase to this file as JSON",
+    )
+    parser.add_argument(
+        "--deploy-manifest",
+        action="store",
+        help="Save output hashes and what changed since the last build to this file",
+    )
+    parser.add_argument(
+        "--gzip",
+        action="store_true",
+        help="Write precompressed .gz copies of HTML, CSS, JS, SVG and JSON outputs",
+    )
+    parser.add_argument(
+        "--gzip-min-size",
+        action="store",
+        type=int,
+        default=DEFAULT_COMPRESS_MIN_SIZE,
+        help="Don't precompress outputs smaller than this many bytes",
+    )
+    parser.add_argument(
+        "--shard",
+        action="store",
+        type=parse_shard,
+        help="Only build part K of N (like 1/4) of the site, see --merge",
+    )
+    parser.add_argument(
+        "--merge",
+        action="store",
+        help="Combine the destinations of --shard builds (comma seperated) instead",
+    )
+    parser.add_argument(
+        "--shard-timings",
+        action="store",
+        help="Balance shards using a --profile report from an earlier build",
+    )
+    parser.add_argument(
+        "--fingerprint",
+        action="store",
+        help="Hash the names of static files matching these globs (comma seperated)",
+    )
+    parser.add_argument(
+        "--search-index",
+        action="store",
+        help="Save a search index of Markdown pages to this directory in the output",
+    )
+    parser.add_argument(
+        "--archive",
+        action="store_true",
+        help="Stream the output into the destination as a .tar, .tar.gz or .zip file",
+    )
+    parser.add_argument(
+        "--plan",
+        action="store_true",
+        help="Print what would be built as JSON without building anything",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Serve the destination and rebuild changed files until stopped",
+    )
+    parser.add_argument(
+        "--port",
+        action="store",
+        type=int,
+        default=8000,
+        help="Port to serve the destination on in watch mode",
+    )
     parser.add_argument("-v", "--verbose", action="store_true", help="Verbose output")
 
     args = parser.parse_args()
 
+    if args.merge:
+        if args.source is not None:
+            parser.error("--merge only takes a destination, not a source")
+        print("Merging.")
+        copied = merge_shards(args.merge.split(","), args.destination)
+        print(f" > Copied {copied} file(s).")
+        print("Done.")
+        return
+    if args.source is None:
+        parser.error("the following arguments are required: source")
+
     ignore_paths = []
     if args.ignore:
         ignore_paths = args.ignore.split(",")
 
+    if args.plan:
+        # Include dependencies recorded by the last incremental build
+        manifest = BuildManifest.load(
+            Path(args.destination).absolute(), {"files_as_dirs": args.files_as_dirs}
+        )
+        plan = plan_build(
+            args.source,
+            args.destination,
+            args.files_as_dirs,
+            ignore_paths,
+            manifest.dependency_map(Path(args.source).absolute()),
+        )
+        json.dump(plan.to_json(), sys.stdout, indent=2)
+        print()
+        return
+
+    if args.watch and args.archive:
+        parser.error("--watch needs a destination directory, not --archive")
+    if args.watch:
+        # Rebuilds only render pages and copy files, these would be ignored
+        unsupported = [
+            flag
+            for (flag, value) in (
+                ("--prune", args.prune),
+                ("--link-report", args.link_report),
+                ("--sync-assets", args.sync_assets),
+                ("--link-assets", args.link_assets),
+                ("--offline", args.offline),
+                ("--profile", args.profile),
+                ("--deploy-manifest", args.deploy_manifest),
+                ("--gzip", args.gzip),
+                ("--shard", args.shard),
+                ("--fingerprint", args.fingerprint),
+                ("--search-index", args.search_index),
+            )
+            if value
+        ]
+        if unsupported:
+            parser.error(f"--watch can't be used with {', '.join(unsupported)}")
+
+    if args.watch:
+        from .watch import watch_directory
+
+        print("Processing.")
+        watch_directory(
+            args.source,
+            args.destination,
+            files_as_dirs=args.files_as_dirs,
+            wipe_first=args.delete,
+            ignore_paths=ignore_paths,
+            debug=args.verbose,
+            jobs=args.jobs,
+            cache_dir=args.cache_dir,
+            port=args.port,
+        )
+        return
+
+    sink = None
+    if args.archive:
+        try:
+            sink = open_archive_sink(args.destination)
+        except ValueError as err:
+            parser.error(str(err))
+
     print("Processing.")
-    process_directory(
-        args.source,
-        args.destination,
-        files_as_dirs=args.files_as_dirs,
-        wipe_first=args.delete,
-        ignore_paths=ignore_paths,
-        debug=args.verbose,
-    )
+    try:
+        process_directory(
+            args.source,
+            args.destination,
+            files_as_dirs=args.files_as_dirs,
+            wipe_first=args.delete,
+            ignore_paths=ignore_paths,
+            debug=args.verbose,
+            incremental=args.incremental,
+            jobs=args.jobs,
+            cache_dir=args.cache_dir,
+            link_report=args.link_report,
+            sync_assets=args.sync_assets,
+            link_assets=args.link_assets,
+            fetch_jobs=args.fetch_jobs,
+            fetch_timeout=args.fetch_timeout,
+            offline=args.offline,
+            profile=args.profile,
+            deploy_manifest=args.deploy_manifest,
+            prune=args.prune,
+            shard=args.shard,
+            precompress=args.gzip,
+            precompress_min_size=args.gzip_min_size,
+            shard_timings=(
+                load_timings(args.shard_timings) if args.shard_timings else None
+            ),
+            sink=sink,
+            fingerprint=args.fingerprint.split(",") if args.fingerprint else None,
+            search_index=args.search_index,
+        )
+    finally:
+        if sink is not None:
+            sink.close()
+
+    if args.deploy_manifest:
+        with open(args.deploy_manifest, "r", encoding="utf-8") as f:
+            deploy = json.load(f)
+        print(
+            f" > {len(deploy['changed'])} changed, {len(deploy['unchanged'])}",
+            f"unchanged, {len(deploy['removed'])} removed.",
+        )
     print("Done.")
 
 
@@ -0,0 +1,176 @@
+import os
+import shutil
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+from .profiling import BuildProfiler, timed_phase
+from .util import atomic_write, hash_file, BuildError
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# ioctl sharing the extents of one file with another (Btrfs, XFS, ...)
+FICLONE = 0x40049409
+
+DEFAULT_COPY_THREADS = 4
+SYNC_MODES = ("mtime", "hash")
+LINK_MODES = ("hardlink", "reflink")
+
+
+def is_unchanged(
+    source_filename: Path,
+    dest_filename: Path,
+    sync: str,
+    source_stat: Optional[os.stat_result] = None,
+) -> bool:
+    """Check if the destination already has the same file as the source."""
+
+    try:
+        dest_stat = dest_filename.stat()
+    except OSError:
+        return False
+    if source_stat is None:
+        source_stat = source_filename.stat()
+
+    if (dest_stat.st_dev, dest_stat.st_ino) == (source_stat.st_dev, source_stat.st_ino):
+        # Hardlinked from a previous build
+        return True
+    if dest_stat.st_size != source_stat.st_size:
+        return False
+
+    if sync == "hash":
+        return hash_file(source_filename) == hash_file(dest_filename)
+    return dest_stat.st_mtime_ns == source_stat.st_mtime_ns
+
+
+def is_same_file(source_filename: Path, dest_filename: Path) -> bool:
+    """Check if the destination is the source itself, like a hardlink to it."""
+    try:
+        return os.path.samefile(source_filename, dest_filename)
+    except OSError:
+        return False
+
+
+def clone_file(source_filename: Path, dest_filename: Path) -> None:
+    """Make a copy-on-write clone of a file, raising OSError if unsupported."""
+
+    if fcntl is None:
+        raise OSError("Copy-on-write clones aren't supported on this platform")
+
+    # Clone next to the destination and swap it in, never writing through the old
+    # file, which may be a hardlink to the source
+    with open(source_filename, "rb") as fsrc, atomic_write(dest_filename) as fdst:
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+    shutil.copystat(source_filename, dest_filename)
+
+
+class AssetCopier(object):
+    """Copy static files to the destination on a thread pool.
+
+    Files already in the destination can be skipped by size and mtime ("mtime") or
+    content ("hash"), and files can be hardlinked or cloned instead of copied, falling
+    back to a plain copy if the filesystem can't."""
+
+    def __init__(
+        self,
+        sync: Optional[str] = None,
+        link: Optional[str] = None,
+        threads: int = DEFAULT_COPY_THREADS,
+        profiler: Optional[BuildProfiler] = None,
+    ):
+        if sync is not None and sync not in SYNC_MODES:
+            raise ValueError(f"Unknown asset sync mode: {sync}")
+        if link is not None and link not in LINK_MODES:
+            raise ValueError(f"Unknown asset link mode: {link}")
+
+        self.sync = sync
+        self.link = link
+        self.profiler = profiler
+
+        self.pool: Optional[ThreadPoolExecutor] = None
+        if threads > 0:
+            self.pool = ThreadPoolExecutor(max_workers=threads)
+        self.pending: list[Future[None]] = []
+
+    def copy(
+        self,
+        source_filename: Path,
+        dest_filename: Path,
+        rel_path: str,
+        source_stat: Optional[os.stat_result] = None,
+    ) -> None:
+        """Copy a file, in the background if there's a thread pool."""
+        if self.pool is not None:
+            self.pending.append(
+                self.pool.submit(
+                    self._copy, source_filename, dest_filename, rel_path, source_stat
+                )
+            )
+        else:
+            self._copy(source_filename, dest_filename, rel_path, source_stat)
+
+    def _copy(
+        self,
+        source_filename: Path,
+        dest_filename: Path,
+        rel_path: str,
+        source_stat: Optional[os.stat_result],
+    ) -> None:
+        # The caller counts the bytes, this is the time spent in the background
+        with timed_phase(self.profiler, rel_path, "copy"):
+            self._copy_file(source_filename, dest_filename, rel_path, source_stat)
+
+    def _copy_file(
+        self,
+        source_filename: Path,
+        dest_filename: Path,
+        rel_path: str,
+        source_stat: Optional[os.stat_result],
+    ) -> None:
+        try:
+            if self.sync is not None and is_unchanged(
+                source_filename, dest_filename, self.sync, source_stat
+            ):
+                return
+
+            if self.link == "hardlink":
+                if is_same_file(source_filename, dest_filename):
+                    # Linked by a previous build
+                    return
+                try:
+                    dest_filename.unlink(missing_ok=True)
+                    os.link(source_filename, dest_filename)
+                    return
+                except OSError:
+                    # Probably a different filesystem, stop trying
+                    self.link = None
+            elif self.link == "reflink":
+                try:
+                    clone_file(source_filename, dest_filename)
+                    return
+                except OSError:
+                    # Filesystem doesn't support clones, stop trying
+                    self.link = None
+
+            try:
+                shutil.copy2(source_filename, dest_filename)
+            except shutil.SameFileError:
+                # Hardlinked from a previous build
+                pass
+        except Exception as err:
+            raise BuildError(
+                f"Failed file copy: /{rel_path}, got error: {err}"
+            ) from err
+
+    def wait(self) -> None:
+        """Wait for the background copies to finish, raising any errors."""
+        for future in self.pending:
+            future.result()
+        self.pending.clear()
+
+    def close(self) -> None:
+        """Stop the thread pool, dropping any copies not started yet."""
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
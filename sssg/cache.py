@@ -0,0 +1,183 @@
+import json
+import os
+from collections import OrderedDict
+from hashlib import sha1
+from pathlib import Path
+from typing import NamedTuple, Optional, Union
+from jinja2 import Environment, FileSystemBytecodeCache, Template
+from jinja2.bccache import Bucket
+from .util import atomic_write, hash_bytes
+
+DEFAULT_TEMPLATE_CACHE_SIZE = 64 * 1024 * 1024
+DEFAULT_MARKDOWN_CACHE_SIZE = 64 * 1024 * 1024
+DEFAULT_MARKDOWN_MEMORY_SIZE = 16 * 1024 * 1024
+
+
+def prune_cache_dir(directory: Path, max_size: int, pattern: str = "*") -> None:
+    """Evict the least recently used files until a cache directory fits in max_size."""
+
+    entries: list[tuple[float, int, Path]] = []
+    total = 0
+    for path in directory.glob(pattern):
+        try:
+            st = path.stat()
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+        total = total + st.st_size
+
+    if total <= max_size:
+        return
+
+    entries.sort()
+    for _, size, path in entries:
+        try:
+            path.unlink()
+        except OSError:
+            # Another build may have removed it already
+            pass
+        total = total - size
+        if total <= max_size:
+            break
+
+
+class TemplateCache(FileSystemBytecodeCache):
+    """Persistent compiled template cache, shared by loader templates and page bodies.
+
+    Entries are keyed by template source hash and evicted least recently used first."""
+
+    def __init__(
+        self,
+        directory: Path,
+        max_size: int = DEFAULT_TEMPLATE_CACHE_SIZE,
+        salt: str = "",
+    ):
+        directory.mkdir(parents=True, exist_ok=True)
+        super().__init__(str(directory))
+        self.max_size = max_size
+        self.salt = salt
+
+    def get_cache_key(self, name: str, filename: Optional[str] = None) -> str:
+        # Compiled code depends on the filters and tests available at compile time
+        key = sha1(f"{self.salt}|{name}".encode("utf-8"))
+        if filename is not None:
+            key.update(f"|{filename}".encode("utf-8"))
+        return key.hexdigest()
+
+    def load_bytecode(self, bucket: Bucket) -> None:
+        super().load_bytecode(bucket)
+        if bucket.code is not None:
+            # Mark the entry as recently used for eviction
+            try:
+                os.utime(self._get_cache_filename(bucket))
+            except OSError:
+                pass
+
+    def from_string(self, env: Environment, source: str) -> Template:
+        """Load a template from a string like Environment.from_string does."""
+        source_hash = hash_bytes(source.encode("utf-8"))
+        bucket = self.get_bucket(env, f"<string {source_hash}>", None, source)
+
+        code = bucket.code
+        if code is None:
+            code = env.compile(source)
+            bucket.code = code
+            self.set_bucket(bucket)
+
+        return env.template_class.from_code(env, code, env.make_globals(None), None)
+
+    def prune(self) -> None:
+        """Evict entries until the cache fits in its size limit."""
+        prune_cache_dir(Path(self.directory), self.max_size, self.pattern % "*")
+
+
+class MarkdownEntry(NamedTuple):
+    """Converted Markdown, with what link rewriting found while converting it."""
+
+    html: str
+    # Fingerprinted path of each link target, or whether it exists
+    targets: dict[str, Union[str, bool]]
+    broken_links: list[str]
+
+
+class MarkdownCache(object):
+    """Cache of converted Markdown, keyed by its text and what else affects the output.
+
+    Recently used entries are kept in memory up to memory_size bytes of HTML, and
+    on disk up to max_size bytes if a directory is given."""
+
+    def __init__(
+        self,
+        directory: Optional[Path] = None,
+        max_size: int = DEFAULT_MARKDOWN_CACHE_SIZE,
+        memory_size: int = DEFAULT_MARKDOWN_MEMORY_SIZE,
+        salt: str = "",
+    ):
+        self.directory = directory
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+        self.memory_size = memory_size
+        self.salt = salt
+
+        self.entries: OrderedDict[str, MarkdownEntry] = OrderedDict()
+        self.size = 0
+
+    def get_key(self, text: str, context: str) -> str:
+        """Key Markdown text converted in a link rewriting context."""
+        return hash_bytes(f"{self.salt}\0{context}\0{text}".encode("utf-8"))
+
+    def get(self, key: str) -> Optional[MarkdownEntry]:
+        """Find a conversion in memory or on disk."""
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            return entry
+        if self.directory is None:
+            return None
+
+        filename = self.directory / f"{key}.json"
+        try:
+            with open(filename, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            entry = MarkdownEntry(data["html"], data["targets"], data["broken_links"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+        try:
+            # Mark the entry as recently used for eviction
+            os.utime(filename)
+        except OSError:
+            pass
+        self._remember(key, entry)
+        return entry
+
+    def set(self, key: str, entry: MarkdownEntry) -> None:
+        """Save a conversion in memory and on disk."""
+        self._remember(key, entry)
+        if self.directory is None:
+            return
+
+        # Other workers never see a partial file
+        try:
+            with atomic_write(self.directory / f"{key}.json", "w", "utf-8") as f:
+                json.dump(entry._asdict(), f)
+        except OSError:
+            # Only a cache, the next build can try again
+            pass
+
+    def _remember(self, key: str, entry: MarkdownEntry) -> None:
+        previous = self.entries.pop(key, None)
+        if previous is not None:
+            self.size = self.size - len(previous.html)
+        self.entries[key] = entry
+        self.size = self.size + len(entry.html)
+
+        while self.size > self.memory_size and len(self.entries) > 1:
+            (_, dropped) = self.entries.popitem(last=False)
+            self.size = self.size - len(dropped.html)
+
+    def prune(self) -> None:
+        """Evict entries on disk until they fit in the size limit."""
+        if self.directory is not None:
+            prune_cache_dir(self.directory, self.max_size, "*.json")
@@ -0,0 +1,98 @@
+import gzip
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+from .profiling import BuildProfiler, timed_phase
+from .util import hash_bytes, write_if_changed, BuildError, StatCache
+
+COMPRESS_STATE_FILENAME = ".sssg-gzip.json"
+COMPRESS_SUFFIXES = (".html", ".htm", ".css", ".js", ".mjs", ".svg", ".json")
+DEFAULT_COMPRESS_MIN_SIZE = 1024
+
+
+def is_compressible(filename: Path) -> bool:
+    """Check if an output is a type worth precompressing."""
+    return filename.suffix.lower() in COMPRESS_SUFFIXES
+
+
+def gzip_sibling(filename: Path) -> Path:
+    """Get the name of the precompressed copy of a file."""
+    return filename.with_name(filename.name + ".gz")
+
+
+class Precompressor(object):
+    """Write .gz siblings of text outputs on a thread pool.
+
+    Files under min_size bytes are skipped, and so are files with the same content
+    as in the last build, by hash. The hashes are kept in the destination."""
+
+    def __init__(
+        self,
+        dest_dir: Path,
+        min_size: int = DEFAULT_COMPRESS_MIN_SIZE,
+        threads: Optional[int] = None,
+        profiler: Optional[BuildProfiler] = None,
+    ):
+        self.dest_dir = dest_dir
+        self.min_size = min_size
+        self.profiler = profiler
+
+        # Hashes of what was last compressed
+        self.hashes = StatCache(
+            dest_dir / COMPRESS_STATE_FILENAME, "files", {"min_size": min_size}
+        )
+
+        # zlib lets go of the GIL while compressing
+        self.pool = ThreadPoolExecutor(max_workers=threads or os.cpu_count() or 1)
+        self.pending: list[tuple[str, Future[None]]] = []
+
+    def compress(self, filename: Path, rel_path: str) -> None:
+        """Precompress the output of a source file in the background if worth it."""
+        if not is_compressible(filename):
+            return
+        self.pending.append(
+            (rel_path, self.pool.submit(self._compress, filename, rel_path))
+        )
+
+    def _compress(self, filename: Path, source_rel_path: str) -> None:
+        rel_path = filename.relative_to(self.dest_dir).as_posix()
+        gz_filename = gzip_sibling(filename)
+
+        st = filename.stat()
+        if st.st_size < self.min_size:
+            gz_filename.unlink(missing_ok=True)
+            return
+
+        if self.hashes.get(rel_path, st) is not None and gz_filename.is_file():
+            # Not even rewritten since last time
+            return
+
+        with timed_phase(self.profiler, source_rel_path, "gzip", st.st_size):
+            with open(filename, "rb") as f:
+                data = f.read()
+            digest = hash_bytes(data)
+            previous = self.hashes.get_previous(rel_path)
+            if previous != digest or not gz_filename.is_file():
+                # No timestamp in the header, so the same input gives the same output
+                write_if_changed(gz_filename, gzip.compress(data, 9, mtime=0))
+        self.hashes.set(rel_path, st, digest)
+
+    def wait(self) -> None:
+        """Wait for the background compression to finish, raising any errors."""
+        for rel_path, future in self.pending:
+            try:
+                future.result()
+            except Exception as err:
+                raise BuildError(
+                    f"Failed compressing: /{rel_path}, got error: {err}"
+                ) from err
+        self.pending.clear()
+
+    def save(self) -> None:
+        """Keep the hashes of what was compressed for the next build."""
+        self.hashes.save()
+
+    def close(self) -> None:
+        """Stop the thread pool, dropping anything not started yet."""
+        self.pool.shutdown(cancel_futures=True)
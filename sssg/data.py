@@ -0,0 +1,162 @@
+import json
+import os
+from collections import OrderedDict
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Iterator, TextIO
+from .profiling import PhaseTimer
+
+DEFAULT_DATA_CACHE_SIZE = 256 * 1024 * 1024
+
+
+def _read_only(self, *args, **kwargs):
+    raise TypeError("Data files are shared between pages and can't be modified")
+
+
+class FrozenDict(dict):
+    """A JSON object from a data file. Still a dict, so filters like tojson work."""
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+
+class FrozenList(list):
+    """A JSON array from a data file."""
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _read_only
+    append = clear = extend = insert = pop = remove = reverse = sort = _read_only
+
+    def __reduce__(self):
+        return (FrozenList, (list(self),))
+
+
+def _freeze_list(items: list) -> FrozenList:
+    return FrozenList(_freeze_list(v) if type(v) is list else v for v in items)
+
+
+def _freeze_object(obj: dict) -> FrozenDict:
+    # Nested objects were frozen already, the parser works from the inside out
+    for key, value in obj.items():
+        if type(value) is list:
+            obj[key] = _freeze_list(value)
+    return FrozenDict(obj)
+
+
+def load_frozen_json(f: TextIO) -> object:
+    """Parse JSON into read-only dicts and lists."""
+    value = json.load(f, object_hook=_freeze_object)
+    if type(value) is list:
+        return _freeze_list(value)
+    return value
+
+
+class DataCache(object):
+    """Parse each JSON data file once and share the result between pages.
+
+    Entries are keyed by path and revalidated by modification time and size. Once
+    the files held add up to more than max_size bytes on disk, the least recently
+    used are dropped. Parsed data is shared, so it's made read-only."""
+
+    def __init__(self, max_size: int = DEFAULT_DATA_CACHE_SIZE):
+        self.max_size = max_size
+        self.size = 0
+        self.entries: OrderedDict[Path, tuple[tuple[int, int], object]] = OrderedDict()
+
+        # Times parsing when profiling, set by the templater
+        self.timer = PhaseTimer()
+
+        # Data files asked for since the last take_used, including missing ones
+        self.used: set[Path] = set()
+
+    def load(self, path: Path) -> object:
+        """Return the parsed contents of a JSON file."""
+        path = Path(os.path.normpath(path))
+        self.used.add(path)
+
+        st = path.stat()
+        key = (st.st_mtime_ns, st.st_size)
+        entry = self.entries.get(path)
+        if entry is not None:
+            if entry[0] == key:
+                self.entries.move_to_end(path)
+                return entry[1]
+            self._drop(path)
+
+        with self.timer.phase("data", st.st_size):
+            with open(path, "r", encoding="utf-8") as f:
+                value = load_frozen_json(f)
+
+        self.entries[path] = (key, value)
+        self.size = self.size + st.st_size
+        while self.size > self.max_size and len(self.entries) > 1:
+            self._drop(next(iter(self.entries)))
+
+        return value
+
+    def _drop(self, path: Path) -> None:
+        ((_, size), _) = self.entries.pop(path)
+        self.size = self.size - size
+
+    def take_used(self) -> list[Path]:
+        """Return the data files asked for since the last call."""
+        (found, self.used) = (self.used, set())
+        return sorted(found)
+
+    def clear(self) -> None:
+        """Drop every cached file."""
+        self.entries.clear()
+        self.size = 0
+
+
+class DataDirectory(Mapping):
+    """The JSON files in a directory, each parsed when first used.
+
+    In templates `data.catalog` is `_data/catalog.json`, and subdirectories nest like
+    `data.shop.products`."""
+
+    def __init__(self, cache: DataCache, directory: Path):
+        self.cache = cache
+        self.directory = directory
+
+    def __getitem__(self, name: str) -> object:
+        if not isinstance(name, str) or name[:1] in ("", ".") or "/" in name:
+            # Only names of files and directories right inside this one
+            raise KeyError(name)
+
+        subdir = self.directory / name
+        if subdir.is_dir():
+            return DataDirectory(self.cache, subdir)
+
+        data_file = self.directory / f"{name}.json"
+        if not data_file.is_file():
+            # Rebuild the page if the file shows up later
+            self.cache.used.add(Path(os.path.normpath(data_file)))
+            raise KeyError(name)
+        return self.cache.load(data_file)
+
+    def _names(self) -> list[str]:
+        names: list[str] = []
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.name.startswith("."):
+                        continue
+                    if entry.is_dir():
+                        names.append(entry.name)
+                    elif entry.name.endswith(".json") and entry.is_file():
+                        names.append(entry.name[: -len(".json")])
+        except OSError:
+            pass
+        return sorted(names)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._names())
+
+    def __len__(self) -> int:
+        return len(self._names())
+
+    def __repr__(self) -> str:
+        return f"<DataDirectory {self.directory}>"
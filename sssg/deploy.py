@@ -0,0 +1,133 @@
+import json
+import os
+from pathlib import Path
+from typing import Generator, Iterable
+from .compress import COMPRESS_STATE_FILENAME
+from .fingerprint import FINGERPRINT_STATE_FILENAME
+from .manifest import MANIFEST_FILENAME
+from .search import SEARCH_STATE_FILENAME
+from .shard import SHARD_MANIFEST_FILENAME
+from .site import SITE_STATE_FILENAME
+from .util import hash_file, StatCache
+
+
+def walk_output(dest_dir: Path, relative_path: str = "") -> Generator[str, None, None]:
+    """Find the relative paths of every file in the destination."""
+    with os.scandir(dest_dir / relative_path) as it:
+        entries = list(it)
+
+    for entry in entries:
+        rel_path = f"{relative_path}/{entry.name}" if relative_path else entry.name
+        if entry.is_dir(follow_symlinks=False):
+            yield from walk_output(dest_dir, rel_path)
+        elif entry.is_file():
+            yield rel_path
+
+
+def prune_outputs(
+    dest_dir: Path, expected: set[Path], keep_dirs: Iterable[Path] = ()
+) -> list[str]:
+    """Delete the files in the destination that aren't expected, then empty directories.
+
+    Nothing inside keep_dirs is touched. Returns the relative paths of the files
+    deleted."""
+    removed: list[str] = []
+    keep_dirs = [d for d in keep_dirs if d.is_relative_to(dest_dir)]
+
+    for dirpath, dirnames, filenames in os.walk(dest_dir, topdown=False):
+        directory = Path(dirpath)
+        if any(directory.is_relative_to(d) for d in keep_dirs):
+            # Like the source or the cache, when they're inside the destination
+            continue
+        # Symlinks to directories aren't walked into, treat them like files
+        links = [d for d in dirnames if (directory / d).is_symlink()]
+        for name in filenames + links:
+            path = directory / name
+            if path not in expected:
+                path.unlink()
+                removed.append(path.relative_to(dest_dir).as_posix())
+
+        if directory != dest_dir and not any(directory.iterdir()):
+            directory.rmdir()
+
+    return sorted(removed)
+
+
+class DeployManifest(object):
+    """Content hashes of every output file, and what changed since the last build.
+
+    Hashes are reused for files whose size and modification time haven't changed, so
+    only new or rewritten outputs are read."""
+
+    def __init__(self, manifest_filename: Path):
+        self.manifest_filename = manifest_filename
+        self.previous: dict[str, dict[str, object]] = {}
+        self.files: dict[str, dict[str, object]] = {}
+        self.changed: list[str] = []
+        self.unchanged: list[str] = []
+        self.removed: list[str] = []
+
+        try:
+            with open(manifest_filename, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, dict) and isinstance(data.get("files"), dict):
+                self.previous = data["files"]
+        except (OSError, ValueError):
+            pass
+
+        # Hashes are reused from the last build, kept in its own format
+        self.hashes = StatCache()
+        for rel_path, previous in self.previous.items():
+            if isinstance(previous, dict):
+                self.hashes.previous[rel_path] = [
+                    previous.get("size"),
+                    previous.get("mtime_ns"),
+                    previous.get("hash"),
+                ]
+
+    def scan(self, dest_dir: Path) -> None:
+        """Hash the outputs in the destination and compare them to the last build."""
+        skip = {
+            MANIFEST_FILENAME,
+            SHARD_MANIFEST_FILENAME,
+            COMPRESS_STATE_FILENAME,
+            FINGERPRINT_STATE_FILENAME,
+            SITE_STATE_FILENAME,
+            SEARCH_STATE_FILENAME,
+        }
+        if self.manifest_filename.parent == dest_dir:
+            skip.add(self.manifest_filename.name)
+
+        for rel_path in sorted(walk_output(dest_dir)):
+            if rel_path in skip:
+                continue
+            st = (dest_dir / rel_path).stat()
+
+            previous = self.previous.get(rel_path)
+            digest = self.hashes.get(rel_path, st)
+            if not isinstance(digest, str):
+                digest = hash_file(dest_dir / rel_path)
+                self.hashes.set(rel_path, st, digest)
+
+            self.files[rel_path] = {
+                "hash": digest,
+                "size": st.st_size,
+                "mtime_ns": st.st_mtime_ns,
+            }
+            if previous is not None and previous.get("hash") == digest:
+                self.unchanged.append(rel_path)
+            else:
+                self.changed.append(rel_path)
+
+        self.removed = sorted(set(self.previous.keys()) - set(self.files.keys()))
+
+    def save(self) -> None:
+        """Write the hashes and the summary as JSON."""
+        data = {
+            "files": self.files,
+            "changed": self.changed,
+            "unchanged": self.unchanged,
+            "removed": self.removed,
+        }
+        with open(self.manifest_filename, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
@@ -0,0 +1,107 @@
+import os
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, Optional
+from .plan import BuildPlan, PlanEntry
+from .profiling import BuildProfiler, timed_phase
+from .util import hash_file, IgnoreMatcher, StatCache
+
+FINGERPRINT_STATE_FILENAME = ".sssg-fingerprints.json"
+FINGERPRINT_LENGTH = 10
+DEFAULT_HASH_THREADS = 4
+
+
+def fingerprinted_name(rel_path: str, digest: str) -> str:
+    """Put a content hash in a file name, like "css/site.0123456789.css"."""
+    (head, name) = posixpath.split(rel_path)
+    (stem, ext) = posixpath.splitext(name)
+    return posixpath.join(head, f"{stem}.{digest[:FINGERPRINT_LENGTH]}{ext}")
+
+
+class HashCache(StatCache):
+    """Content hashes of source files, reused while their size and mtime match."""
+
+    def hash(
+        self,
+        rel_path: str,
+        filename: Path,
+        st: Optional[os.stat_result] = None,
+        profiler: Optional[BuildProfiler] = None,
+    ) -> str:
+        """Hash a file, unless it looks the same as last time."""
+        if st is None:
+            st = filename.stat()
+
+        digest = self.get(rel_path, st)
+        if not isinstance(digest, str):
+            with timed_phase(profiler, rel_path, "fingerprint", st.st_size):
+                digest = hash_file(filename)
+            self.set(rel_path, st, digest)
+        return digest
+
+
+class Fingerprints(object):
+    """Fingerprinted output paths of static files, by source path.
+
+    Lookups are remembered so a page can record which ones it used."""
+
+    def __init__(self, names: Optional[dict[str, str]] = None):
+        self.names: dict[str, str] = dict(names or {})
+        self.used: dict[str, Optional[str]] = {}
+
+    def update(self, names: dict[str, str]) -> None:
+        """Replace the fingerprinted paths."""
+        self.names = dict(names)
+
+    def get(self, rel_path: str) -> Optional[str]:
+        """Find the output path of a static file without remembering the lookup."""
+        return self.names.get(rel_path)
+
+    def lookup(self, rel_path: str) -> Optional[str]:
+        """Find the output path of a static file, or None if it isn't fingerprinted."""
+        name = self.names.get(rel_path)
+        self.used[rel_path] = name
+        return name
+
+    def take_used(self) -> dict[str, Optional[str]]:
+        """Return the lookups made since the last call."""
+        (found, self.used) = (self.used, {})
+        return found
+
+
+def fingerprint_plan(
+    plan: BuildPlan,
+    patterns: Iterable[str],
+    hashes: HashCache,
+    profiler: Optional[BuildProfiler] = None,
+    threads: int = DEFAULT_HASH_THREADS,
+) -> tuple[BuildPlan, dict[str, str]]:
+    """Rename the static files matching gitignore style patterns by content hash.
+
+    Returns the new plan and the fingerprinted output path of each renamed source
+    path. Files are hashed on a thread pool, since hashlib lets go of the GIL."""
+
+    matcher = IgnoreMatcher(patterns)
+    chosen = [
+        e
+        for e in plan.entries
+        if e.kind == "asset" and matcher.match(f"/{e.rel_path}")
+    ]
+    if not chosen:
+        return plan, {}
+
+    with ThreadPoolExecutor(max_workers=max(threads, 1)) as pool:
+        digests = pool.map(
+            lambda e: hashes.hash(e.rel_path, e.source, e.stat, profiler), chosen
+        )
+        renamed: dict[str, PlanEntry] = {}
+        for entry, digest in zip(chosen, digests):
+            dest_rel = fingerprinted_name(entry.dest_rel, digest)
+            renamed[entry.rel_path] = entry._replace(
+                dest=plan.dest_dir / dest_rel, dest_rel=dest_rel
+            )
+
+    entries = tuple(renamed.get(e.rel_path, e) for e in plan.entries)
+    names = {rel_path: e.dest_rel for (rel_path, e) in renamed.items()}
+    return plan._replace(entries=entries), names
@@ -3,6 +3,9 @@ import hashlib
 import hmac
 import os
 from collections.abc import Callable
+from typing import Optional
+from jinja2 import pass_context
+from jinja2.runtime import Context
 
 
 def b64encode(text: str) -> str:
@@ -37,7 +40,30 @@ def sign_sha1(value: str) -> str:
     ).decode("utf-8")
 
 
-def add_custom_filters(filters: dict[str, Callable[[str], str]]):
+def make_asset_url(
+    lookup: Optional[Callable[[str], Optional[str]]] = None
+) -> Callable[[Context, str], str]:
+    """Make a filter turning a path from the site root into a URL for the page.
+
+    Fingerprinted static files get their hashed name from lookup."""
+
+    @pass_context
+    def asset_url(context: Context, path: str) -> str:
+        rel_path = path.lstrip("/")
+        if lookup is not None:
+            rel_path = lookup(rel_path) or rel_path
+        if path.startswith("/"):
+            return "/" + rel_path
+        return str(context.get("path_to_root", "")) + rel_path
+
+    return asset_url
+
+
+def add_custom_filters(
+    filters: dict[str, Callable[[str], str]],
+    lookup_asset: Optional[Callable[[str], Optional[str]]] = None,
+):
+    filters["asset_url"] = make_asset_url(lookup_asset)
     filters["b64decode"] = b64decode
     filters["b64encode"] = b64encode
     filters["sign_sha1"] = sign_sha1
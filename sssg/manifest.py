@@ -0,0 +1,194 @@
+import json
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
+from .util import hash_bytes
+
+if TYPE_CHECKING:
+    from .templater import Templater
+    from .workers import PageResult
+
+MANIFEST_FILENAME = ".sssg-manifest.json"
+MANIFEST_VERSION = 5
+
+
+class BuildManifest(object):
+    """Record the inputs of each built page so unchanged pages can be skipped."""
+
+    def __init__(self, dest_dir: Path, options: dict[str, object]):
+        self.dest_dir = dest_dir
+        self.options = options
+        self.pages: dict[str, dict[str, object]] = {}
+
+        # Hashes of data files, memoized for the current build
+        self._data_hashes: dict[Path, Optional[str]] = {}
+
+    @classmethod
+    def load(cls, dest_dir: Path, options: dict[str, object]) -> "BuildManifest":
+        """Load the manifest from a previous build, if it's still usable."""
+        manifest = cls(dest_dir, options)
+
+        try:
+            with open(dest_dir / MANIFEST_FILENAME, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return manifest
+
+        if (
+            isinstance(data, dict)
+            and data.get("version") == MANIFEST_VERSION
+            and data.get("options") == options
+        ):
+            manifest.pages = data.get("pages", {})
+
+        return manifest
+
+    def save(self) -> None:
+        """Write the manifest to the destination directory."""
+        data = {
+            "version": MANIFEST_VERSION,
+            "options": self.options,
+            "pages": self.pages,
+        }
+        with open(self.dest_dir / MANIFEST_FILENAME, "w", encoding="utf-8") as f:
+            json.dump(data, f, default=str, sort_keys=True)
+
+    def data_hash(self, path: Path) -> Optional[str]:
+        """Hash a data file, or None if it can't be read."""
+        if path not in self._data_hashes:
+            try:
+                with open(path, "rb") as f:
+                    self._data_hashes[path] = hash_bytes(f.read())
+            except OSError:
+                self._data_hashes[path] = None
+        return self._data_hashes[path]
+
+    def is_fresh(self, rel_path: str, source_hash: str, tmpl: "Templater") -> bool:
+        """Check if a page was built from the same inputs as it is now."""
+        entry = self.pages.get(rel_path)
+        if entry is None or entry["hash"] != source_hash:
+            return False
+
+        templates = entry["templates"]
+        if templates is None:
+            # Dependencies couldn't be determined, always rebuild
+            return False
+        for name, digest in templates.items():
+            if tmpl.template_hash(name) != digest:
+                return False
+
+        for name, digest in entry["data"].items():
+            if self.data_hash(Path(name)) != digest:
+                return False
+
+        for name, fingerprinted in entry["assets"].items():
+            if tmpl.fingerprints.get(name) != fingerprinted:
+                return False
+
+        for name, digest in entry["site"].items():
+            if tmpl.site.digest(name) != digest:
+                return False
+
+        if not self.links_unchanged(entry, tmpl):
+            return False
+
+        for output in entry["outputs"]:
+            if not (self.dest_dir / output).is_file():
+                return False
+
+        return True
+
+    def record(
+        self,
+        rel_path: str,
+        source_hash: str,
+        dest_filename: Path,
+        tmpl: "Templater",
+        result: "PageResult",
+    ) -> None:
+        """Record the inputs used to build a page, from its result."""
+        self.pages[rel_path] = {
+            "hash": source_hash,
+            "broken_links": result.broken_links,
+            "outputs": [dest_filename.relative_to(self.dest_dir).as_posix()],
+            "templates": (
+                None
+                if result.templates is None
+                else {
+                    name: tmpl.template_hash(name) for name in sorted(result.templates)
+                }
+            ),
+            "data": {str(p): self.data_hash(p) for p in result.data_files},
+            "assets": result.assets,
+            "site": result.site,
+            "targets": result.targets,
+            "meta": result.meta,
+        }
+
+    def dependents(
+        self, template_names: set[str], data_files: set[Path]
+    ) -> list[str]:
+        """Find the pages that use any of the given templates or data files."""
+        data_names = {str(p) for p in data_files}
+        found: list[str] = []
+        for rel_path, entry in self.pages.items():
+            templates = entry["templates"]
+            if (
+                templates is None
+                or not template_names.isdisjoint(templates)
+                or not data_names.isdisjoint(entry["data"])
+            ):
+                found.append(rel_path)
+        return found
+
+    def site_dependents(self, tmpl: "Templater") -> list[str]:
+        """Find the pages that used a part of the site index that changed."""
+        found: list[str] = []
+        for rel_path, entry in self.pages.items():
+            for name, digest in entry["site"].items():
+                if tmpl.site.digest(name) != digest:
+                    found.append(rel_path)
+                    break
+        return found
+
+    def links_unchanged(self, entry: dict[str, object], tmpl: "Templater") -> bool:
+        """Check if a page's Markdown links would still be rewritten the same way."""
+        rewriter = tmpl.link_rewriter
+        return all(
+            rewriter.target_state(target) == state
+            for (target, state) in entry["targets"].items()
+        )
+
+    def link_dependents(self, tmpl: "Templater") -> list[str]:
+        """Find the pages with Markdown links to targets added or removed since."""
+        return [
+            rel_path
+            for (rel_path, entry) in self.pages.items()
+            if not self.links_unchanged(entry, tmpl)
+        ]
+
+    def dependency_map(self, source_dir: Path) -> dict[str, tuple[str, ...]]:
+        """List what each page depended on when it was built.
+
+        Templates are by name and data files by path, relative to the source if
+        they're in it."""
+        found: dict[str, tuple[str, ...]] = {}
+        for rel_path, entry in self.pages.items():
+            deps = list(entry["templates"] or ())
+            for name in entry["data"]:
+                data_file = Path(name)
+                if data_file.is_relative_to(source_dir):
+                    data_file = data_file.relative_to(source_dir)
+                deps.append(data_file.as_posix())
+            found[rel_path] = tuple(deps)
+        return found
+
+    def forget_data(self, data_files: set[Path]) -> None:
+        """Drop memoized hashes after data files changed on disk."""
+        for path in data_files:
+            self._data_hashes.pop(path, None)
+
+    def prune(self, rel_paths: set[str]) -> None:
+        """Forget pages that are no longer in the source."""
+        for rel_path in list(self.pages.keys()):
+            if rel_path not in rel_paths:
+                del self.pages[rel_path]
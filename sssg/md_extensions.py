@@ -1,15 +1,27 @@
+import posixpath
 from pathlib import Path
 from markdown import Extension
 from markdown.treeprocessors import Treeprocessor
 import xml.etree.ElementTree as eTree
 
-from typing import Optional
+from typing import Optional, Union
+from .fingerprint import Fingerprints
+from .profiling import PhaseTimer
+from .util import SourceIndex
 
 
 class LinkRewriterExtension(Extension):
     def __init__(self, **kwargs):
         self.src_filename: Optional[Path] = None
         self.dst_filename: Optional[Path] = None
+        self.source_index: Optional[SourceIndex] = None
+        self.fingerprints: Optional[Fingerprints] = None
+        self.broken_links: list[str] = []
+        # What each link target looked up turned into, for caching conversions
+        self.checked_targets: dict[str, Union[str, bool]] = {}
+        # Link targets every conversion since the last take depended on, cached or not
+        self.used_targets: dict[str, Union[str, bool]] = {}
+        self.timer = PhaseTimer()
         self.config = {
             "files_as_dirs": [False, "True if files_as_dirs is enabled"],
             "entrypoint": ["", "Entry path for the templater"],
@@ -27,6 +39,58 @@ class LinkRewriterExtension(Extension):
         self.src_filename = src
         self.dst_filename = dst
 
+    def set_source_index(self, index: Optional[SourceIndex]):
+        """Resolve links against an index of the source instead of the disk."""
+        self.source_index = index
+
+    def set_fingerprints(self, fingerprints: Optional[Fingerprints]):
+        """Link to static files by their fingerprinted names."""
+        self.fingerprints = fingerprints
+
+    def take_broken_links(self) -> list[str]:
+        """Return the links found to be broken since the last call."""
+        (found, self.broken_links) = (self.broken_links, [])
+        return found
+
+    def take_checked_targets(self) -> dict[str, Union[str, bool]]:
+        """Return the link targets looked up since the last call."""
+        (found, self.checked_targets) = (self.checked_targets, {})
+        return found
+
+    def take_used_targets(self) -> dict[str, Union[str, bool]]:
+        """Return the link targets conversions depended on since the last call."""
+        (found, self.used_targets) = (self.used_targets, {})
+        return found
+
+    def target_exists(self, target_rel: str) -> bool:
+        """Check if a path relative to the entrypoint is in the source."""
+        if self.source_index is not None:
+            return target_rel in self.source_index
+        entrypoint = self.getConfig("entrypoint", "")
+        if not entrypoint:
+            return False
+        try:
+            return (Path(entrypoint) / target_rel).exists()
+        except IOError:
+            return False
+
+    def target_state(self, target_rel: str) -> Union[str, bool]:
+        """Get the fingerprinted path of a link target, or whether it exists."""
+        if self.fingerprints is not None:
+            name = self.fingerprints.lookup(target_rel)
+            if name is not None:
+                return name
+        return self.target_exists(target_rel)
+
+    def rewrite_context(self) -> str:
+        """Describe everything besides link targets that rewritten links depend on."""
+        entrypoint = self.getConfig("entrypoint", "")
+        if not self.src_filename or not self.dst_filename or not entrypoint:
+            return ""
+        src_rel_dir = self.src_filename.parent.relative_to(entrypoint).as_posix()
+        is_index = self.src_filename.name.startswith("index.")
+        return f"{self.getConfig('files_as_dirs', False)}|{src_rel_dir}|{is_index}"
+
 
 class LinkRewriterTreeprocessor(Treeprocessor):
     """Rewrite links in Markdown from original filesystem path to the final output path."""
@@ -42,7 +106,20 @@ class LinkRewriterTreeprocessor(Treeprocessor):
             Path(entrypoint) if entrypoint and len(entrypoint) > 0 else None
         )
 
+        # Output names of source paths, memoized across pages
+        self.destination_names: dict[str, tuple[str, bool]] = {}
+
     def run(self, root: eTree.Element) -> None:
+        with self.extension.timer.phase("links"):
+            self.rewrite_links(root)
+
+    def rewrite_links(self, root: eTree.Element) -> None:
+        self.src_rel_dir: Optional[str] = None
+        if self.extension.src_filename and self.entrypoint:
+            self.src_rel_dir = self.extension.src_filename.parent.relative_to(
+                self.entrypoint
+            ).as_posix()
+
         for child in root.iter("a"):
             href = child.get("href")
             converted_path = self.get_converted_path(href)
@@ -54,11 +131,68 @@ class LinkRewriterTreeprocessor(Treeprocessor):
             if converted_path != href:
                 child.set("src", converted_path)
 
-    def get_converted_path(self, href: str) -> str:
+    def target_exists(self, target_rel: str) -> bool:
+        """Check if a path relative to the entrypoint is in the source."""
+        state = self.extension.target_state(target_rel)
+        self.extension.checked_targets[target_rel] = state
+        return state is not False
+
+    def resolve_target(self, href: str) -> Optional[str]:
+        """Find the source path a link points at, if it's in the source."""
+        target_rel = posixpath.normpath(posixpath.join(self.src_rel_dir, href))
+        if target_rel == ".." or target_rel.startswith("../"):
+            # Outside of the source directory
+            return None
+        if not self.target_exists(target_rel):
+            return None
+        return target_rel
+
+    def is_broken_link(self, href: str) -> bool:
+        """Check if a link that wasn't rewritten points at nothing."""
+        if href.startswith("#") or ":" in href:
+            # Anchors and other schemes like mailto:
+            return False
+
+        path = href.split("#", 1)[0].split("?", 1)[0]
+        if path != href and self.resolve_target(path) is not None:
+            # Links to an anchor or with a query on an existing file
+            return False
+
+        return True
+
+    def get_destination_name(self, target_rel: str) -> tuple[str, bool]:
+        """Get the output filename of a source path, and whether it's a page."""
+        state = self.extension.checked_targets.get(target_rel)
+        if isinstance(state, str):
+            # Fingerprinted static file
+            return posixpath.basename(state), False
+        if target_rel not in self.destination_names:
+            dst_rel = Path(target_rel)
+            dst_suffixes = dst_rel.suffixes
+
+            # Remove the always-stripped file extensions
+            if ".j2" in dst_suffixes:
+                dst_suffixes.remove(".j2")
+            if ".sssg-copy" in dst_suffixes:
+                dst_suffixes.remove(".sssg-copy")
+
+            dst_basename = str(dst_rel.name).split(".")[0]
+            if ".html" in dst_suffixes or ".md" in dst_suffixes:
+                self.destination_names[target_rel] = (dst_basename, True)
+            else:
+                self.destination_names[target_rel] = (
+                    dst_basename + ".".join(dst_suffixes),
+                    False,
+                )
+        return self.destination_names[target_rel]
+
+    def get_converted_path(self, href: Optional[str]) -> Optional[str]:
         if (
-            not self.extension.src_filename
+            href is None
+            or not self.extension.src_filename
             or not self.extension.dst_filename
             or not self.entrypoint
+            or self.src_rel_dir is None
         ):
             # Not configured for translation
             return href
@@ -72,52 +206,35 @@ class LinkRewriterTreeprocessor(Treeprocessor):
             # It's also probably invalid, but we're not going to worry about that here
             return href
 
-        href_abs = (
-            (self.extension.src_filename.parent / href_local).resolve().absolute()
-        )
-        try:
+        target_rel = self.resolve_target(href_local.as_posix())
+        if target_rel is None:
             # If the file doesn't exist, don't attempt to rewrite it
-            if not href_abs.exists():
-                print(
-                    " > In",
-                    self.extension.src_filename,
-                    "link to",
-                    href,
-                    "does not exist.",
-                )
-                return href
-        except IOError:
+            if self.is_broken_link(href):
+                self.extension.broken_links.append(href)
             return href
 
         # Blindly calculate the relativeness of the href's final destination
-        relative_parts = list(href_abs.relative_to(self.extension.src_filename.parent, walk_up=True).parts)
-        if self.files_as_dirs and not self.extension.src_filename.name.startswith("index."):
+        relative_pathing = posixpath.dirname(
+            posixpath.relpath(target_rel, self.src_rel_dir)
+        )
+        if self.files_as_dirs and not self.extension.src_filename.name.startswith(
+            "index."
+        ):
             # Add an extra 'up'
-            relative_parts.insert(0, "..")
-        relative_pathing = "/".join(relative_parts[:-1])
+            relative_pathing = posixpath.join("..", relative_pathing).rstrip("/")
         if len(relative_pathing) == 0:
             # Same parent dir
             relative_pathing = "."
 
-        dst_rel = href_abs.relative_to(self.entrypoint)
-        dst_suffixes = dst_rel.suffixes
-
-        # Remove the always-stripped file extensions
-        if ".j2" in dst_suffixes:
-            dst_suffixes.remove(".j2")
-        if ".sssg-copy" in dst_suffixes:
-            dst_suffixes.remove(".sssg-copy")
-
         # Calculate the final href
-        dst_basename = str(dst_rel.name).split(".")[0]
-        if ".html" in dst_suffixes or ".md" in dst_suffixes:
-            if not self.files_as_dirs:
-                final_path = f"{relative_pathing}/{dst_basename}.html"
-            elif dst_basename == "index":
-                final_path = f"{relative_pathing}/"
-            else:
-                final_path = f"{relative_pathing}/{dst_basename}/"
+        (dst_name, is_page) = self.get_destination_name(target_rel)
+        if not is_page:
+            final_path = f"{relative_pathing}/{dst_name}"
+        elif not self.files_as_dirs:
+            final_path = f"{relative_pathing}/{dst_name}.html"
+        elif dst_name == "index":
+            final_path = f"{relative_pathing}/"
         else:
-            final_path = f"{relative_pathing}/{dst_basename}" + ".".join(dst_suffixes)
+            final_path = f"{relative_pathing}/{dst_name}/"
 
         return final_path
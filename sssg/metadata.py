@@ -0,0 +1,71 @@
+import copy
+import re
+from collections import OrderedDict
+from .util import hash_bytes
+
+DEFAULT_METADATA_CACHE_ENTRIES = 4096
+
+# The YAML delimiter python-frontmatter looks for, a line of three or more dashes
+YAML_BOUNDARY = re.compile(r"^-{3,}\s*$", re.MULTILINE)
+# The other formats it knows: a line with just { for JSON, +++ for TOML
+OTHER_BOUNDARY = re.compile(r"^(?:{$|\+{3,}\s*$)", re.MULTILINE)
+
+
+def load_yaml(text: str) -> object:
+    """Parse YAML safely, with the C loader if PyYAML was built with it."""
+    # Imported on first use, most startup paths never see frontmatter
+    import yaml
+
+    return yaml.load(text, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader))
+
+
+class MetadataCache(object):
+    """Parsed YAML frontmatter, keyed by the hash of the block.
+
+    Pages are read more than once a build (for site.pages, dependencies and
+    rendering), and many share the same frontmatter. Each caller gets its own copy,
+    so templates modifying metadata don't affect other pages."""
+
+    def __init__(self, max_entries: int = DEFAULT_METADATA_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.entries: OrderedDict[str, dict[str, object]] = OrderedDict()
+
+    def load(self, block: str) -> dict[str, object]:
+        """Parse a frontmatter block, or {} if it isn't a mapping."""
+        key = hash_bytes(block.encode("utf-8"))
+        meta = self.entries.get(key)
+        if meta is None:
+            value = load_yaml(block)
+            meta = value if isinstance(value, dict) else {}
+            self.entries[key] = meta
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        else:
+            self.entries.move_to_end(key)
+        return copy.deepcopy(meta)
+
+
+_cache = MetadataCache()
+
+
+def parse_frontmatter(content: str) -> tuple[str, dict[str, object]]:
+    """Split a page into its content and metadata, the same as frontmatter.loads.
+
+    Pages without a leading --- line are never handed to a parser. Other formats
+    python-frontmatter knows (JSON, TOML) still go through it, but only when the
+    page starts with their boundary line, not for pages like {% extends %}."""
+    text = content.strip()
+    if OTHER_BOUNDARY.match(text):
+        import frontmatter
+
+        post = frontmatter.loads(content)
+        return post.content, post.metadata
+    if not YAML_BOUNDARY.match(text):
+        return text, {}
+
+    parts = YAML_BOUNDARY.split(text, 2)
+    if len(parts) != 3:
+        # No closing delimiter
+        return text, {}
+    (_, block, body) = parts
+    return body.strip(), _cache.load(block)
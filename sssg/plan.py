@@ -0,0 +1,124 @@
+import os
+from pathlib import Path
+from typing import Iterable, NamedTuple, Optional
+from .util import map_output_path, walk_source
+
+# What the build does with a source file
+PAGE_KINDS = ("template", "markdown")
+PLAN_KINDS = PAGE_KINDS + ("copy", "asset")
+
+
+class PlanEntry(NamedTuple):
+    """One source file, where it ends up and how it gets there."""
+
+    source: Path
+    dest: Path
+    # Where the output goes relative to the destination, separated by "/"
+    dest_rel: str
+    rel_path: str
+    kind: str
+    path_to_root: str
+    stat: Optional[os.stat_result] = None
+    # Templates by name and data files by path, from the last incremental build
+    dependencies: tuple[str, ...] = ()
+
+    @property
+    def is_page(self) -> bool:
+        return self.kind in PAGE_KINDS
+
+    def to_json(self) -> dict[str, object]:
+        return {
+            "source": self.rel_path,
+            "dest": self.dest_rel,
+            "kind": self.kind,
+            "path_to_root": self.path_to_root,
+            "size": self.stat.st_size if self.stat is not None else None,
+            "dependencies": list(self.dependencies),
+        }
+
+
+class BuildPlan(NamedTuple):
+    """Everything a build will do, worked out without changing anything on disk."""
+
+    source_dir: Path
+    dest_dir: Path
+    files_as_dirs: bool
+    entries: tuple[PlanEntry, ...]
+
+    def pages(self) -> tuple[PlanEntry, ...]:
+        """The entries rendered as templates or Markdown."""
+        return tuple(e for e in self.entries if e.is_page)
+
+    def outputs(self) -> set[Path]:
+        """Every destination path the build writes."""
+        return {e.dest for e in self.entries}
+
+    def to_json(self) -> dict[str, object]:
+        return {
+            "source": str(self.source_dir),
+            "destination": str(self.dest_dir),
+            "files_as_dirs": self.files_as_dirs,
+            "entries": [e.to_json() for e in self.entries],
+        }
+
+
+def plan_file(
+    source_dir: Path,
+    dest_dir: Path,
+    source_filename: Path,
+    files_as_dirs: bool,
+    source_stat: Optional[os.stat_result] = None,
+    dependencies: Iterable[str] = (),
+) -> PlanEntry:
+    """Work out what the build does with a single source file."""
+
+    if source_filename.suffix == ".j2" or source_filename.suffix == ".md":
+        # Run anything ending in .j2 as a template
+        # Assume .md files are templates so they get turned into HTML
+        kind = "markdown" if ".md" in source_filename.suffixes else "template"
+    elif source_filename.suffix == ".sssg-copy":
+        kind = "copy"
+    else:
+        kind = "asset"
+
+    (dest_filename, ptr) = map_output_path(
+        source_dir, dest_dir, source_filename, files_as_dirs
+    )
+    rel_path = "/".join(source_filename.parts[len(source_dir.parts) :])
+    return PlanEntry(
+        source_filename,
+        dest_filename,
+        dest_filename.relative_to(dest_dir).as_posix(),
+        rel_path,
+        kind,
+        ptr,
+        source_stat,
+        tuple(dependencies),
+    )
+
+
+def plan_build(
+    source_dir: Path,
+    dest_dir: Path,
+    files_as_dirs: bool = False,
+    ignore_paths: Optional[list[str]] = None,
+    dependencies: Optional[dict[str, tuple[str, ...]]] = None,
+) -> BuildPlan:
+    """Walk the source and plan the build of every file in it.
+
+    dependencies maps relative source paths to what they depend on, if known."""
+
+    source_dir = Path(source_dir).absolute()
+    dest_dir = Path(dest_dir).absolute()
+    dependencies = dependencies or {}
+
+    entries: list[PlanEntry] = []
+    for source_file in walk_source(source_dir, ignore_paths):
+        entry = plan_file(
+            source_dir, dest_dir, source_file.path, files_as_dirs, source_file.stat
+        )
+        if entry.rel_path in dependencies:
+            entry = entry._replace(dependencies=dependencies[entry.rel_path])
+        entries.append(entry)
+
+    return BuildPlan(source_dir, dest_dir, files_as_dirs, tuple(entries))
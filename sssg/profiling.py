@@ -0,0 +1,149 @@
+import json
+import threading
+import time
+from contextlib import nullcontext
+from pathlib import Path
+from typing import ContextManager, Optional
+
+# Phase name to [seconds, bytes]
+PhaseTimings = dict[str, list[float]]
+
+
+class _Phase(object):
+    def __init__(self, timer: "PhaseTimer", name: str, nbytes: int):
+        self.timer = timer
+        self.name = name
+        self.nbytes = nbytes
+
+    def __enter__(self):
+        self.timer.stack.append(0.0)
+        self.start = time.perf_counter()
+
+    def __exit__(self, *args):
+        elapsed = time.perf_counter() - self.start
+        nested = self.timer.stack.pop()
+        if self.timer.stack:
+            # Don't count this phase again in the one around it
+            self.timer.stack[-1] = self.timer.stack[-1] + elapsed
+        self.timer.add(self.name, elapsed - nested, self.nbytes)
+
+
+class PhaseTimer(object):
+    """Time the phases of rendering a page, excluding nested phases from each other.
+
+    Does nothing unless enabled."""
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.timings: PhaseTimings = {}
+        self.stack: list[float] = []
+
+    def phase(self, name: str, nbytes: int = 0) -> ContextManager:
+        """Time a block of code as the named phase."""
+        if not self.enabled:
+            return nullcontext()
+        return _Phase(self, name, nbytes)
+
+    def add(self, name: str, seconds: float, nbytes: int = 0) -> None:
+        """Add time spent in a phase."""
+        timing = self.timings.setdefault(name, [0.0, 0])
+        timing[0] = timing[0] + seconds
+        timing[1] = timing[1] + nbytes
+
+    def take(self) -> PhaseTimings:
+        """Return the timings recorded since the last call."""
+        (found, self.timings) = (self.timings, {})
+        return found
+
+
+class BuildProfiler(object):
+    """Collect the timings of every file in a build and report on them."""
+
+    def __init__(self):
+        self.files: dict[str, PhaseTimings] = {}
+        self.lock = threading.Lock()
+
+    def add(self, rel_path: str, name: str, seconds: float, nbytes: int = 0) -> None:
+        """Add time spent on a file in a phase, from any thread.
+
+        An empty rel_path is for phases of the build as a whole."""
+        with self.lock:
+            timing = self.files.setdefault(rel_path, {}).setdefault(name, [0.0, 0])
+            timing[0] = timing[0] + seconds
+            timing[1] = timing[1] + nbytes
+
+    def add_timings(self, rel_path: str, timings: PhaseTimings) -> None:
+        """Add the timings of a page, usually from a PhaseTimer in a worker."""
+        for name, (seconds, nbytes) in timings.items():
+            self.add(rel_path, name, seconds, int(nbytes))
+
+    def report(self) -> dict[str, object]:
+        """Summarize the timings by phase and by file, slowest files first."""
+        phases: dict[str, dict[str, float]] = {}
+        files: list[dict[str, object]] = []
+
+        for rel_path, timings in self.files.items():
+            for name, (seconds, nbytes) in timings.items():
+                phase = phases.setdefault(name, {"seconds": 0.0, "bytes": 0})
+                phase["seconds"] = phase["seconds"] + seconds
+                phase["bytes"] = phase["bytes"] + nbytes
+            if not rel_path:
+                # Phases of the build as a whole, like walking the source
+                continue
+            files.append(
+                {
+                    "path": rel_path,
+                    "seconds": sum(t[0] for t in timings.values()),
+                    "phases": {
+                        name: {"seconds": seconds, "bytes": nbytes}
+                        for (name, (seconds, nbytes)) in timings.items()
+                    },
+                }
+            )
+
+        files.sort(key=lambda f: f["seconds"], reverse=True)
+        return {"phases": phases, "files": files}
+
+    def write_report(self, report_filename: Path, top: int = 20) -> None:
+        """Save the report as JSON and print the slowest files."""
+        report = self.report()
+        with open(report_filename, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+        print("Time by phase:")
+        for name, phase in sorted(
+            report["phases"].items(), key=lambda p: p[1]["seconds"], reverse=True
+        ):
+            print(f"  {name:>12} {phase['seconds'] * 1000:10.1f}ms")
+
+        print(f"Slowest {top} files:")
+        for entry in report["files"][:top]:
+            (slowest, _) = max(
+                entry["phases"].items(), key=lambda p: p[1]["seconds"]
+            )
+            print(f"  {entry['seconds'] * 1000:10.1f}ms  /{entry['path']} ({slowest})")
+
+
+def timed_phase(
+    profiler: Optional[BuildProfiler], rel_path: str, name: str, nbytes: int = 0
+) -> ContextManager:
+    """Time a block of code for a file, if profiling."""
+    if profiler is None:
+        return nullcontext()
+    return _TimedPhase(profiler, rel_path, name, nbytes)
+
+
+class _TimedPhase(object):
+    def __init__(self, profiler: BuildProfiler, rel_path: str, name: str, nbytes: int):
+        self.profiler = profiler
+        self.rel_path = rel_path
+        self.name = name
+        self.nbytes = nbytes
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *args):
+        self.profiler.add(
+            self.rel_path, self.name, time.perf_counter() - self.start, self.nbytes
+        )
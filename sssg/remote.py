@@ -0,0 +1,246 @@
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
+from urllib import error
+from .assets import is_unchanged
+from .profiling import BuildProfiler, timed_phase
+from .sinks import OutputSink
+from .util import atomic_write, hash_bytes, BuildError
+
+if TYPE_CHECKING:
+    from http.client import HTTPResponse
+
+DEFAULT_FETCH_JOBS = 8
+# Seconds a server can go without sending anything before a download fails
+DEFAULT_FETCH_TIMEOUT = 30.0
+
+
+def open_url(
+    url: str,
+    headers: Optional[dict[str, str]] = None,
+    timeout: float = DEFAULT_FETCH_TIMEOUT,
+) -> "HTTPResponse":
+    """Open a URL for reading, giving up on a server that stops responding."""
+    # Slow to import, and most builds never download anything
+    from urllib import request
+
+    return request.urlopen(request.Request(url, headers=headers or {}), timeout=timeout)
+
+
+def _is_timeout(err: BaseException) -> bool:
+    """Check if a download failed because the server stopped responding."""
+    if isinstance(err, error.URLError):
+        return isinstance(err.reason, socket.timeout)
+    return isinstance(err, socket.timeout)
+
+
+def _timeout_error(url: str, timeout: float) -> BuildError:
+    """Describe a download that timed out, naming the URL."""
+    return BuildError(f"Timed out downloading {url} after {timeout:g} seconds")
+
+
+def save_url(
+    url: str, body_filename: Path, timeout: float = DEFAULT_FETCH_TIMEOUT
+) -> None:
+    """Download a URL to a file, replacing it only once the download is complete."""
+    try:
+        with open_url(url, timeout=timeout) as resp, atomic_write(body_filename) as f:
+            shutil.copyfileobj(resp, f)
+    except Exception as err:
+        if _is_timeout(err):
+            raise _timeout_error(url, timeout) from err
+        raise
+
+
+def download_to_sink(
+    url: str, sink: OutputSink, rel_path: str, timeout: float = DEFAULT_FETCH_TIMEOUT
+) -> int:
+    """Download a URL into a sink through a temporary file, returning its size."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        filename = Path(temp_dir) / "download"
+        save_url(url, filename, timeout)
+        sink.copy_file(rel_path, filename)
+        return os.path.getsize(filename)
+
+
+class RemoteFetcher(object):
+    """Fetch remote .sssg-copy targets concurrently.
+
+    Each URL is downloaded once per build, however many targets share it. With a
+    cache directory, downloads are kept between builds and revalidated with
+    ETag/Last-Modified. In offline mode only the cache is used. Destinations that
+    already have the same contents are left alone."""
+
+    def __init__(
+        self,
+        cache_dir: Optional[Path] = None,
+        jobs: int = DEFAULT_FETCH_JOBS,
+        offline: bool = False,
+        profiler: Optional[BuildProfiler] = None,
+        timeout: float = DEFAULT_FETCH_TIMEOUT,
+    ):
+        self.cache_dir = cache_dir
+        if self.cache_dir is not None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.offline = offline
+        self.profiler = profiler
+        self.timeout = timeout
+
+        self.pool = ThreadPoolExecutor(max_workers=max(jobs, 1))
+        self.pending: list[tuple[str, Future[None]]] = []
+
+        # One download per URL, shared by every target fetching it
+        self.downloads: dict[str, Future[Path]] = {}
+        self.lock = threading.Lock()
+        # Where downloads go for the length of the build without a cache
+        self.temp_dir: Optional[tempfile.TemporaryDirectory] = None
+
+    def fetch(
+        self,
+        url: str,
+        dest_filename: Path,
+        rel_path: str,
+        sink: Optional[OutputSink] = None,
+    ) -> None:
+        """Save a URL to a file in the background.
+
+        With a sink, dest_filename is the path within it."""
+        self.pending.append(
+            (
+                rel_path,
+                self.pool.submit(self._fetch, url, dest_filename, rel_path, sink),
+            )
+        )
+
+    def _fetch(
+        self,
+        url: str,
+        dest_filename: Path,
+        rel_path: str,
+        sink: Optional[OutputSink],
+    ) -> None:
+        with timed_phase(self.profiler, rel_path, "fetch"):
+            nbytes = self._fetch_to(url, dest_filename, sink)
+        if self.profiler is not None:
+            self.profiler.add(rel_path, "fetch", 0, nbytes)
+
+    def _fetch_to(
+        self, url: str, dest_filename: Path, sink: Optional[OutputSink]
+    ) -> int:
+        body_filename = self._download(url)
+
+        local_filename = dest_filename
+        if sink is not None:
+            local_filename = sink.local_path(dest_filename.as_posix())
+        if local_filename is None:
+            sink.copy_file(dest_filename.as_posix(), body_filename)
+        elif not is_unchanged(body_filename, local_filename, "hash"):
+            # Copied here rather than by a directory sink's copier, which may still
+            # link source files when the download is gone and could be on another
+            # filesystem. Unchanged files keep their modification time.
+            local_filename.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(body_filename, local_filename)
+        return body_filename.stat().st_size
+
+    def _download(self, url: str) -> Path:
+        """Download a URL once, waiting for it if another target already started."""
+        with self.lock:
+            future = self.downloads.get(url)
+            started = future is not None
+            if not started:
+                future = Future()
+                self.downloads[url] = future
+
+        if not started:
+            try:
+                if self.cache_dir is not None:
+                    future.set_result(self._fetch_cached(url))
+                else:
+                    future.set_result(self._fetch_uncached(url))
+            except BaseException as err:
+                future.set_exception(err)
+        return future.result()
+
+    def _fetch_uncached(self, url: str) -> Path:
+        """Download a URL to a temporary file kept until the fetcher is closed."""
+        if self.offline:
+            raise BuildError("Not available offline without a cache directory")
+
+        with self.lock:
+            if self.temp_dir is None:
+                self.temp_dir = tempfile.TemporaryDirectory()
+            temp_dir = Path(self.temp_dir.name)
+        body_filename = temp_dir / hash_bytes(url.encode("utf-8"))
+        save_url(url, body_filename, self.timeout)
+        return body_filename
+
+    def _fetch_cached(self, url: str) -> Path:
+        """Make sure the cache has an up to date copy of a URL and return its path."""
+        key = hash_bytes(url.encode("utf-8"))
+        body_filename = self.cache_dir / key
+        meta_filename = self.cache_dir / f"{key}.json"
+
+        meta: dict[str, str] = {}
+        if body_filename.is_file():
+            try:
+                with open(meta_filename, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                meta = {}
+        elif self.offline:
+            raise BuildError("Not in the download cache")
+
+        if self.offline:
+            return body_filename
+
+        headers: dict[str, str] = {}
+        if "etag" in meta:
+            headers["If-None-Match"] = meta["etag"]
+        if "last_modified" in meta:
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+        try:
+            with open_url(url, headers, self.timeout) as resp:
+                with atomic_write(body_filename) as f:
+                    shutil.copyfileobj(resp, f)
+
+                meta = {"url": url}
+                if resp.headers.get("ETag"):
+                    meta["etag"] = resp.headers["ETag"]
+                if resp.headers.get("Last-Modified"):
+                    meta["last_modified"] = resp.headers["Last-Modified"]
+                with atomic_write(meta_filename, "w", "utf-8") as f:
+                    json.dump(meta, f)
+        except error.HTTPError as err:
+            if err.code != 304 or not headers:
+                raise
+            # Not modified, the cached copy is still good
+        except Exception as err:
+            if _is_timeout(err):
+                raise _timeout_error(url, self.timeout) from err
+            raise
+
+        return body_filename
+
+    def wait(self) -> None:
+        """Wait for the background fetches to finish, raising any errors."""
+        for rel_path, future in self.pending:
+            try:
+                future.result()
+            except Exception as err:
+                raise BuildError(
+                    f"Failed file copy: /{rel_path}, got error: {err}"
+                ) from err
+        self.pending.clear()
+
+    def close(self) -> None:
+        """Stop the thread pool, dropping any fetches not started yet."""
+        self.pool.shutdown(cancel_futures=True)
+        if self.temp_dir is not None:
+            self.temp_dir.cleanup()
@@ -0,0 +1,198 @@
+import json
+import re
+from collections import Counter
+from pathlib import Path
+from typing import NamedTuple, Optional
+from .sinks import OutputSink
+
+SEARCH_STATE_FILENAME = ".sssg-search.json"
+DEFAULT_SEARCH_DIR = "search"
+DEFAULT_PREFIX_LENGTH = 2
+# Each word in the title counts as this many in the body
+TITLE_WEIGHT = 5
+MAX_TERM_LENGTH = 32
+
+# Link targets, HTML tags and bare URLs aren't words on the page
+_MARKUP = re.compile(r"\]\([^)]*\)|<[^>]*>|https?://\S+")
+_WORD = re.compile(r"[^\W_]{2,}")
+# Anything shard_filename can return, and its precompressed copy
+_SHARD_FILENAME = re.compile(r"(?:[A-Za-z0-9]+|_[0-9a-f]+)\.json(?:\.gz)?")
+
+
+class SearchDoc(NamedTuple):
+    """The searchable words of a page."""
+
+    title: str
+    terms: dict[str, int]
+
+
+def tokenize(text: str) -> list[str]:
+    """Split Markdown into lowercase words of at least two letters or digits."""
+    words = _WORD.findall(_MARKUP.sub(" ", text).lower())
+    return [w for w in words if len(w) <= MAX_TERM_LENGTH]
+
+
+def make_search_doc(text: str, meta: dict[str, object]) -> SearchDoc:
+    """Count the words in a page's Markdown and its title."""
+    title = str(meta.get("title") or "")
+    terms = Counter(tokenize(text))
+    for word in tokenize(title):
+        terms[word] = terms[word] + TITLE_WEIGHT
+    return SearchDoc(title, dict(terms))
+
+
+def shard_filename(prefix: str) -> str:
+    """Name the shard for a prefix, hex encoding anything that isn't plain ASCII."""
+    if prefix.isascii() and prefix.isalnum():
+        return f"{prefix}.json"
+    return f"_{prefix.encode('utf-8').hex()}.json"
+
+
+class SearchIndex(object):
+    """An inverted index of page words, saved as JSON shards by word prefix.
+
+    The words of every page are kept between builds, so only pages that were
+    rebuilt need indexing again and only shards with changed words are rewritten."""
+
+    def __init__(
+        self,
+        state_filename: Optional[Path] = None,
+        prefix_length: int = DEFAULT_PREFIX_LENGTH,
+    ):
+        self.state_filename = state_filename
+        self.prefix_length = prefix_length
+
+        # Relative path to [id, url, title, terms]
+        self.docs: dict[str, list] = {}
+        self.next_id = 1
+        self.shards: set[str] = set()
+        loaded = False
+        if state_filename is not None:
+            try:
+                with open(state_filename, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if (
+                    isinstance(data, dict)
+                    and data.get("prefix_length") == prefix_length
+                ):
+                    self.docs = data["docs"]
+                    self.next_id = data["next_id"]
+                    self.shards = set(data["shards"])
+                    loaded = True
+            except (OSError, ValueError, KeyError):
+                pass
+
+        # Prefixes whose shards need writing, None for all of them
+        self.dirty: Optional[set[str]] = set() if loaded else None
+
+    def _touch(self, terms: dict[str, int]) -> None:
+        if self.dirty is not None:
+            self.dirty.update(t[: self.prefix_length] for t in terms)
+
+    def has(self, rel_path: str) -> bool:
+        """Check if a page is indexed already."""
+        return rel_path in self.docs
+
+    def add(self, rel_path: str, url: str, doc: SearchDoc) -> None:
+        """Index a page, replacing what it had before."""
+        previous = self.docs.get(rel_path)
+        if previous is not None:
+            if previous[1:] == [url, doc.title, doc.terms]:
+                return
+            doc_id = previous[0]
+            self._touch(previous[3])
+        else:
+            doc_id = self.next_id
+            self.next_id = self.next_id + 1
+        self.docs[rel_path] = [doc_id, url, doc.title, doc.terms]
+        self._touch(doc.terms)
+
+    def discard(self, rel_path: str) -> None:
+        """Remove a page from the index."""
+        previous = self.docs.pop(rel_path, None)
+        if previous is not None:
+            self._touch(previous[3])
+
+    def prune(self, rel_paths: set[str]) -> None:
+        """Remove pages that are no longer in the source."""
+        for rel_path in list(self.docs.keys()):
+            if rel_path not in rel_paths:
+                self.discard(rel_path)
+
+    def write(
+        self, sink: OutputSink, search_dir: str = DEFAULT_SEARCH_DIR
+    ) -> list[str]:
+        """Save the index and the shards that changed, returning the paths written.
+
+        Shards no longer needed are deleted from directory sinks."""
+        index_rel = f"{search_dir}/index.json"
+        index_filename = sink.local_path(index_rel)
+        dirty = self.dirty
+        if index_filename is None or not index_filename.is_file():
+            # Nothing to update, like an archive or a wiped destination
+            dirty = None
+
+        shards: dict[str, dict[str, list[list[int]]]] = {}
+        for doc_id, _, _, terms in self.docs.values():
+            for term, count in terms.items():
+                prefix = term[: self.prefix_length]
+                if dirty is not None and prefix not in dirty:
+                    continue
+                shards.setdefault(prefix, {}).setdefault(term, []).append(
+                    [doc_id, count]
+                )
+
+        written: list[str] = []
+        for prefix, postings in sorted(shards.items()):
+            # Best matches first, then by document
+            for entries in postings.values():
+                entries.sort(key=lambda e: (-e[1], e[0]))
+            rel_path = f"{search_dir}/{shard_filename(prefix)}"
+            data = json.dumps(
+                postings, ensure_ascii=False, sort_keys=True, separators=(",", ":")
+            )
+            sink.write_bytes(rel_path, data.encode("utf-8"))
+            written.append(rel_path)
+
+        all_prefixes = {
+            t[: self.prefix_length] for doc in self.docs.values() for t in doc[3]
+        }
+        search_path = sink.local_path(search_dir)
+        if search_path is not None and search_path.is_dir():
+            # Whatever built them before, like a build without the state file
+            keep = {shard_filename(p) for p in all_prefixes} | {"index.json"}
+            keep.update({f"{name}.gz" for name in keep})
+            for path in search_path.iterdir():
+                if _SHARD_FILENAME.fullmatch(path.name) and path.name not in keep:
+                    path.unlink(missing_ok=True)
+        self.shards = all_prefixes
+
+        index = {
+            "prefix_length": self.prefix_length,
+            "shards": {p: shard_filename(p) for p in sorted(all_prefixes)},
+            "docs": {
+                str(doc_id): [url, title]
+                for (doc_id, url, title, _) in sorted(
+                    self.docs.values(), key=lambda d: d[0]
+                )
+            },
+        }
+        data = json.dumps(index, ensure_ascii=False, separators=(",", ":"))
+        sink.write_bytes(index_rel, data.encode("utf-8"))
+        written.append(index_rel)
+        self.dirty = set()
+        return written
+
+    def save(self) -> None:
+        """Keep the words of every page for the next build."""
+        if self.state_filename is None:
+            return
+        data = {
+            "prefix_length": self.prefix_length,
+            "next_id": self.next_id,
+            "shards": sorted(self.shards),
+            "docs": self.docs,
+        }
+        self.state_filename.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.state_filename, "w", encoding="utf-8") as f:
+            json.dump(data, f, sort_keys=True)
@@ -0,0 +1,148 @@
+import filecmp
+import json
+import shutil
+from pathlib import Path
+from typing import Optional
+from .assets import is_unchanged
+from .compress import gzip_sibling
+from .plan import BuildPlan, PlanEntry
+from .util import BuildError
+
+SHARD_MANIFEST_FILENAME = ".sssg-shard.json"
+
+
+def parse_shard(value: str) -> tuple[int, int]:
+    """Parse a shard given as "K/N", numbered from 1."""
+    try:
+        (index, count) = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise ValueError(f"Shard should look like 1/4, got {value}") from None
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError(f"Shard {value} is out of range")
+    return index, count
+
+
+def load_timings(profile_filename: Path) -> dict[str, float]:
+    """Read the seconds spent on each file from a --profile report."""
+    with open(profile_filename, "r", encoding="utf-8") as f:
+        report = json.load(f)
+    return {entry["path"]: entry["seconds"] for entry in report.get("files", [])}
+
+
+def _balance(
+    entries: list[PlanEntry], weights: dict[str, float], count: int
+) -> list[list[PlanEntry]]:
+    # Heaviest first onto the lightest shard, ties broken by path for determinism
+    shards: list[list[PlanEntry]] = [[] for _ in range(count)]
+    totals = [0.0] * count
+    for entry in sorted(entries, key=lambda e: (-weights[e.rel_path], e.rel_path)):
+        lightest = totals.index(min(totals))
+        shards[lightest].append(entry)
+        totals[lightest] = totals[lightest] + weights[entry.rel_path]
+    return shards
+
+
+def _size(entry: PlanEntry) -> float:
+    return float(entry.stat.st_size) if entry.stat is not None else 0.0
+
+
+def shard_plan(
+    plan: BuildPlan,
+    index: int,
+    count: int,
+    timings: Optional[dict[str, float]] = None,
+) -> BuildPlan:
+    """Keep the part of a plan one of count shards builds, numbered from 1.
+
+    Pages are balanced by the seconds they took before if timings are given,
+    otherwise by source size. Static files are balanced by size. The same plan
+    always splits the same way."""
+
+    if not 1 <= index <= count:
+        raise ValueError(f"Shard {index}/{count} is out of range")
+
+    pages = [e for e in plan.entries if e.is_page]
+    others = [e for e in plan.entries if not e.is_page]
+
+    page_weights = {e.rel_path: _size(e) for e in pages}
+    if timings:
+        # Pages not timed before count as an average one
+        known = [timings[e.rel_path] for e in pages if e.rel_path in timings]
+        average = sum(known) / len(known) if known else 1.0
+        page_weights = {e.rel_path: timings.get(e.rel_path, average) for e in pages}
+
+    other_weights = {e.rel_path: _size(e) for e in others}
+    chosen = {
+        e.rel_path
+        for e in _balance(pages, page_weights, count)[index - 1]
+        + _balance(others, other_weights, count)[index - 1]
+    }
+
+    # Keep source order
+    entries = tuple(e for e in plan.entries if e.rel_path in chosen)
+    return plan._replace(entries=entries)
+
+
+def write_shard_manifest(plan: BuildPlan, index: int, count: int) -> None:
+    """List the outputs a shard built, for merging."""
+    outputs = [e.dest for e in plan.entries]
+    outputs.extend(gzip_sibling(p) for p in list(outputs))
+    files = sorted(
+        p.relative_to(plan.dest_dir).as_posix() for p in outputs if p.is_file()
+    )
+    data = {"shard": index, "count": count, "files": files}
+    with open(plan.dest_dir / SHARD_MANIFEST_FILENAME, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+
+
+def merge_shards(shard_dirs: list[str], dest_dir: str) -> int:
+    """Combine the outputs of shard builds into one destination.
+
+    Raises BuildError if shards are missing, or two shards built different files
+    at the same path. Returns the number of files copied."""
+
+    dest_path = Path(dest_dir).absolute()
+    sources: dict[str, Path] = {}
+    collisions: list[str] = []
+    seen: dict[int, Path] = {}
+    counts: set[int] = set()
+
+    for shard_dir in shard_dirs:
+        shard_path = Path(shard_dir).absolute()
+        try:
+            with open(shard_path / SHARD_MANIFEST_FILENAME, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as err:
+            raise BuildError(f"Not a shard build: {shard_path}, got error: {err}")
+
+        (index, count) = (data["shard"], data["count"])
+        counts.add(count)
+        if index in seen:
+            raise BuildError(f"Shard {index} given twice: {seen[index]}, {shard_path}")
+        seen[index] = shard_path
+
+        for rel_path in data["files"]:
+            source_filename = shard_path / rel_path
+            previous = sources.get(rel_path)
+            if previous is None:
+                sources[rel_path] = source_filename
+            elif not filecmp.cmp(previous, source_filename, shallow=False):
+                collisions.append(rel_path)
+
+    if len(counts) > 1:
+        raise BuildError(f"Shards are from splits of different sizes: {sorted(counts)}")
+    missing = sorted(set(range(1, max(counts, default=0) + 1)) - set(seen.keys()))
+    if missing:
+        raise BuildError(f"Missing shards: {', '.join(str(i) for i in missing)}")
+    if collisions:
+        raise BuildError(f"Shards built different files at: {', '.join(collisions)}")
+
+    copied = 0
+    for rel_path, source_filename in sorted(sources.items()):
+        dest_filename = dest_path / rel_path
+        if is_unchanged(source_filename, dest_filename, "mtime"):
+            continue
+        dest_filename.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(source_filename, dest_filename)
+        copied = copied + 1
+    return copied
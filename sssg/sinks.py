@@ -0,0 +1,211 @@
+import copy
+import os
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
+import zipfile
+from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO, Iterable, Optional, Union
+from .util import write_chunks_if_changed, write_if_changed, STREAM_BUFFER_SIZE
+
+if TYPE_CHECKING:
+    from .assets import AssetCopier
+
+
+class OutputSink(object):
+    """Somewhere to save the output of a build.
+
+    Paths are relative to the root of the site and separated by "/". Sinks can be
+    written from several threads at once."""
+
+    def local_path(self, rel_path: str) -> Optional[Path]:
+        """Get the real file for a path, if the sink is a directory on disk."""
+        return None
+
+    def write_bytes(self, rel_path: str, data: bytes) -> bool:
+        """Save a file, returning whether it changed."""
+        raise NotImplementedError()
+
+    def write_chunks(self, rel_path: str, chunks: Iterable[str]) -> bool:
+        """Save text produced a piece at a time, returning whether it changed."""
+        return self.write_bytes(rel_path, "".join(chunks).encode("utf-8"))
+
+    def copy_file(
+        self,
+        rel_path: str,
+        source_filename: Path,
+        source_stat: Optional[os.stat_result] = None,
+    ) -> None:
+        """Save a copy of a file. source_stat saves looking it up again if known."""
+        with open(source_filename, "rb") as f:
+            self.write_bytes(rel_path, f.read())
+
+    def close(self) -> None:
+        """Finish writing the output."""
+        pass
+
+    def __enter__(self) -> "OutputSink":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+class DirectorySink(OutputSink):
+    """Save the output to a directory, the default.
+
+    With a copier, files are copied through it, so they can be synced and linked
+    in the background."""
+
+    def __init__(self, root: Union[str, Path], copier: Optional["AssetCopier"] = None):
+        self.root = Path(root).absolute()
+        self.copier = copier
+
+    def __getstate__(self) -> dict[str, object]:
+        # The copier's threads stay in this process, other processes copy directly
+        return dict(self.__dict__, copier=None)
+
+    def with_copier(self, copier: "AssetCopier") -> "DirectorySink":
+        """Get a copy of this sink copying files through copier."""
+        sink = copy.copy(self)
+        sink.copier = copier
+        return sink
+
+    def local_path(self, rel_path: str) -> Optional[Path]:
+        return self.root / rel_path if rel_path else self.root
+
+    def _prepare(self, rel_path: str) -> Path:
+        dest_filename = self.root / rel_path
+        dest_filename.parent.mkdir(parents=True, exist_ok=True)
+        return dest_filename
+
+    def write_bytes(self, rel_path: str, data: bytes) -> bool:
+        return write_if_changed(self._prepare(rel_path), data)
+
+    def write_chunks(self, rel_path: str, chunks: Iterable[str]) -> bool:
+        return write_chunks_if_changed(self._prepare(rel_path), chunks)
+
+    def copy_file(
+        self,
+        rel_path: str,
+        source_filename: Path,
+        source_stat: Optional[os.stat_result] = None,
+    ) -> None:
+        dest_filename = self._prepare(rel_path)
+        if self.copier is not None:
+            self.copier.copy(source_filename, dest_filename, rel_path, source_stat)
+        else:
+            shutil.copy2(source_filename, dest_filename)
+
+
+class MemorySink(OutputSink):
+    """Keep the output in memory as a mapping of path to contents."""
+
+    def __init__(self):
+        self.files: dict[str, bytes] = {}
+        self.lock = threading.Lock()
+
+    def write_bytes(self, rel_path: str, data: bytes) -> bool:
+        with self.lock:
+            changed = self.files.get(rel_path) != data
+            self.files[rel_path] = data
+        return changed
+
+
+class TarSink(OutputSink):
+    """Stream the output into a tar archive, gzipped if compression is "gz"."""
+
+    def __init__(
+        self, archive: Union[str, Path, BinaryIO], compression: Optional[str] = None
+    ):
+        mode = f"w|{compression or ''}"
+        if isinstance(archive, (str, Path)):
+            self.tar = tarfile.open(str(archive), mode)
+        else:
+            self.tar = tarfile.open(fileobj=archive, mode=mode)
+        self.lock = threading.Lock()
+
+    def _add(self, rel_path: str, f: BinaryIO, size: int, mtime: float) -> None:
+        info = tarfile.TarInfo(rel_path)
+        (info.size, info.mtime, info.mode) = (size, int(mtime), 0o644)
+        with self.lock:
+            self.tar.addfile(info, f)
+
+    def write_bytes(self, rel_path: str, data: bytes) -> bool:
+        with tempfile.SpooledTemporaryFile(STREAM_BUFFER_SIZE) as f:
+            f.write(data)
+            f.seek(0)
+            self._add(rel_path, f, len(data), time.time())
+        return True
+
+    def write_chunks(self, rel_path: str, chunks: Iterable[str]) -> bool:
+        # Tar headers need the size up front, so big output goes to disk first
+        with tempfile.SpooledTemporaryFile(STREAM_BUFFER_SIZE) as f:
+            for chunk in chunks:
+                f.write(chunk.encode("utf-8"))
+            size = f.tell()
+            f.seek(0)
+            self._add(rel_path, f, size, time.time())
+        return True
+
+    def copy_file(
+        self,
+        rel_path: str,
+        source_filename: Path,
+        source_stat: Optional[os.stat_result] = None,
+    ) -> None:
+        with open(source_filename, "rb") as f:
+            st = os.fstat(f.fileno())
+            self._add(rel_path, f, st.st_size, st.st_mtime)
+
+    def close(self) -> None:
+        self.tar.close()
+
+
+class ZipSink(OutputSink):
+    """Stream the output into a zip archive."""
+
+    def __init__(self, archive: Union[str, Path, BinaryIO]):
+        self.zip = zipfile.ZipFile(
+            archive, "w", zipfile.ZIP_DEFLATED, strict_timestamps=False
+        )
+        self.lock = threading.Lock()
+
+    def write_bytes(self, rel_path: str, data: bytes) -> bool:
+        with self.lock:
+            self.zip.writestr(rel_path, data)
+        return True
+
+    def write_chunks(self, rel_path: str, chunks: Iterable[str]) -> bool:
+        info = zipfile.ZipInfo(rel_path, time.localtime()[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED
+        with self.lock, self.zip.open(info, "w", force_zip64=True) as f:
+            for chunk in chunks:
+                f.write(chunk.encode("utf-8"))
+        return True
+
+    def copy_file(
+        self,
+        rel_path: str,
+        source_filename: Path,
+        source_stat: Optional[os.stat_result] = None,
+    ) -> None:
+        with self.lock:
+            self.zip.write(source_filename, rel_path)
+
+    def close(self) -> None:
+        self.zip.close()
+
+
+def open_archive_sink(archive_filename: str) -> OutputSink:
+    """Open a tar, gzipped tar or zip sink based on the file name."""
+    name = archive_filename.lower()
+    if name.endswith(".zip"):
+        return ZipSink(archive_filename)
+    elif name.endswith(".tar.gz") or name.endswith(".tgz"):
+        return TarSink(archive_filename, "gz")
+    elif name.endswith(".tar"):
+        return TarSink(archive_filename)
+    raise ValueError(f"Unknown archive type: {archive_filename}")
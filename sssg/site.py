@@ -0,0 +1,244 @@
+import json
+import os
+import posixpath
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, NamedTuple, Optional, Union
+from .plan import BuildPlan
+from .profiling import BuildProfiler, timed_phase
+from .util import hash_bytes, BuildError, StatCache
+
+if TYPE_CHECKING:
+    from .templater import Templater
+
+SITE_STATE_FILENAME = ".sssg-site.json"
+
+
+class PageRecord(NamedTuple):
+    """What the site index knows about a page without reading its body."""
+
+    path: str
+    dest: str
+    url: str
+    path_to_root: str
+    is_markdown: bool
+    meta: dict[str, object]
+
+
+def page_url(dest_rel: str, files_as_dirs: bool) -> str:
+    """Get the URL of a page from the site root, like "/blog/post.html"."""
+    if files_as_dirs and posixpath.basename(dest_rel) == "index.html":
+        # Served as the directory
+        dest_rel = posixpath.dirname(dest_rel)
+        return f"/{dest_rel}/" if dest_rel else "/"
+    return f"/{dest_rel}"
+
+
+class PageIndexCache(StatCache):
+    """Frontmatter of pages from the last build, reused while size and mtime match."""
+
+    def __init__(self, state_filename: Optional[Path] = None):
+        StatCache.__init__(self, state_filename, "pages")
+
+    def set(self, rel_path: str, st: os.stat_result, meta: object) -> None:
+        """Remember the frontmatter of a page, if JSON can hold it exactly."""
+        try:
+            if json.loads(json.dumps(meta)) != meta:
+                # Like dates, which would come back as strings
+                return
+        except (TypeError, ValueError):
+            return
+        StatCache.set(self, rel_path, st, meta)
+
+
+def index_pages(
+    plan: BuildPlan,
+    read_metadata: Callable[[str], tuple[str, dict[str, object]]],
+    cache: Optional[PageIndexCache] = None,
+    profiler: Optional[BuildProfiler] = None,
+) -> list[PageRecord]:
+    """Read the frontmatter of every page in a plan, sorted by source path."""
+
+    records: list[PageRecord] = []
+    for entry in sorted(plan.pages(), key=lambda e: e.rel_path):
+        st = entry.stat if entry.stat is not None else entry.source.stat()
+        meta = cache.get(entry.rel_path, st) if cache is not None else None
+        if not isinstance(meta, dict):
+            try:
+                with timed_phase(profiler, entry.rel_path, "index", st.st_size):
+                    with open(entry.source, "r", encoding="utf-8") as f:
+                        (_, meta) = read_metadata(f.read())
+            except Exception as err:
+                kind = "markdown" if entry.kind == "markdown" else "template"
+                raise BuildError(
+                    f"Failed processing {kind} file: /{entry.rel_path}, "
+                    f"got error: {err}"
+                ) from err
+            if cache is not None:
+                cache.set(entry.rel_path, st, meta)
+
+        records.append(
+            PageRecord(
+                entry.rel_path,
+                entry.dest_rel,
+                page_url(entry.dest_rel, plan.files_as_dirs),
+                entry.path_to_root,
+                entry.kind == "markdown",
+                meta,
+            )
+        )
+    return records
+
+
+class PageInfo(object):
+    """A page in site.pages. Frontmatter fields can be used like attributes.
+
+    content (the source without frontmatter) and html (the body rendered as on its
+    own page, without the layout) are only loaded when used."""
+
+    def __init__(self, site: "Site", record: PageRecord):
+        self.site = site
+        self.record = record
+        self.path = record.path
+        self.dest = record.dest
+        self.url = record.url
+        self.meta = record.meta
+
+    @property
+    def content(self) -> str:
+        return self.site.load_content(self.record)
+
+    @property
+    def html(self) -> str:
+        return self.site.render_html(self.record)
+
+    def get(self, key: str, default: object = None) -> object:
+        return self.meta.get(key, default)
+
+    def __getitem__(self, key: str) -> object:
+        return self.meta[key]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.meta
+
+    def __repr__(self) -> str:
+        return f"<PageInfo {self.path}>"
+
+
+class Site(object):
+    """The site global in templates, with the index of every page.
+
+    Lookups are remembered so a page can record what it used: the whole index, or
+    the source of another page."""
+
+    def __init__(self, tmpl: "Templater", source_dir: Path):
+        self.tmpl = tmpl
+        self.source_dir = source_dir
+        self._records: Optional[list[PageRecord]] = []
+        self._load_records: Optional[Callable[[], list[PageRecord]]] = None
+        self.used: dict[str, Optional[str]] = {}
+
+        self._pages: Optional[list[PageInfo]] = None
+        self._digest: Optional[str] = None
+        self._hashes: dict[str, Optional[str]] = {}
+        self._content: dict[str, str] = {}
+        self._html: dict[str, str] = {}
+        self._rendering: set[str] = set()
+
+    def update(
+        self, records: Union[list[PageRecord], Callable[[], list[PageRecord]]]
+    ) -> None:
+        """Replace the index, forgetting anything loaded from the old one.
+
+        records can be a function returning them, called the first time the index
+        is used, so builds never using site.pages don't read every page."""
+        if callable(records):
+            (self._records, self._load_records) = (None, records)
+        else:
+            (self._records, self._load_records) = (list(records), None)
+        self._pages = None
+        self._digest = None
+        self.forget()
+
+    @property
+    def records(self) -> list[PageRecord]:
+        if self._records is None:
+            self._records = self._load_records()
+        return self._records
+
+    def forget(self) -> None:
+        """Drop loaded page sources after they changed on disk."""
+        self._hashes.clear()
+        self._content.clear()
+        self._html.clear()
+
+    @property
+    def pages(self) -> list[PageInfo]:
+        self.used[""] = self.digest("")
+        if self._pages is None:
+            self._pages = [PageInfo(self, record) for record in self.records]
+        return self._pages
+
+    def digest(self, name: str) -> Optional[str]:
+        """Hash the index for "", otherwise the source of a page."""
+        if name == "":
+            if self._digest is None:
+                data = json.dumps(self.records, default=str, sort_keys=True)
+                self._digest = hash_bytes(data.encode("utf-8"))
+            return self._digest
+
+        if name not in self._hashes:
+            try:
+                with open(self.source_dir / name, "rb") as f:
+                    self._hashes[name] = hash_bytes(f.read())
+            except OSError:
+                self._hashes[name] = None
+        return self._hashes[name]
+
+    def take_used(self) -> dict[str, Optional[str]]:
+        """Return the lookups made since the last call."""
+        (found, self.used) = (self.used, {})
+        return found
+
+    def load_content(self, record: PageRecord) -> str:
+        """Read a page's source without its frontmatter."""
+        self.used[record.path] = self.digest(record.path)
+        if record.path not in self._content:
+            with open(self.source_dir / record.path, "r", encoding="utf-8") as f:
+                (content, _) = self.tmpl.read_metadata(f.read())
+            self._content[record.path] = content
+        return self._content[record.path]
+
+    def render_html(self, record: PageRecord) -> str:
+        """Render a page's body, converting Markdown, as it would be on its own page."""
+        self.used[record.path] = self.digest(record.path)
+        if record.path in self._html:
+            return self._html[record.path]
+        if record.path in self._rendering:
+            raise BuildError(f"Page /{record.path} uses its own html")
+
+        source_filename = self.source_dir / record.path
+        with open(source_filename, "r", encoding="utf-8") as f:
+            text = f.read()
+
+        # Render as the other page, then go back to the current one
+        rewriter = self.tmpl.link_rewriter
+        (src_filename, dst_filename) = (rewriter.src_filename, rewriter.dst_filename)
+        found_broken = len(rewriter.broken_links)
+        self._rendering.add(record.path)
+        try:
+            (body, _) = self.tmpl.generate_string(
+                text,
+                source_filename,
+                Path(record.dest),
+                path_to_root=record.path_to_root,
+            )
+            if record.is_markdown:
+                body = str(self.tmpl.convert_markdown(body))
+        finally:
+            self._rendering.discard(record.path)
+            rewriter.set_current_filenames(src_filename, dst_filename)
+            # Broken links belong to the other page
+            del rewriter.broken_links[found_broken:]
+
+        self._html[record.path] = body
+        return body
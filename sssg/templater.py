@@ -1,38 +1,112 @@
 import inspect
 import json
-from jinja2 import Environment, FileSystemLoader
+import os
+import jinja2
+import markdown
+import pymdownx
+from jinja2 import Environment, FileSystemLoader, Template, TemplateNotFound
+from jinja2 import meta as jinja_meta
 from markdown import Markdown
 from markupsafe import Markup
-import frontmatter
 from pathlib import Path
+from typing import Iterable, Iterator, Optional
+from .cache import MarkdownCache, MarkdownEntry, TemplateCache
+from .data import DataCache, DataDirectory
+from .fingerprint import Fingerprints
 from .jinja_filters import add_custom_filters
 from .md_extensions import LinkRewriterExtension
+from .metadata import parse_frontmatter
+from .profiling import PhaseTimer
+from .search import SearchDoc, make_search_doc
+from .site import Site
+from .util import hash_bytes
+
+MARKDOWN_EXTENSIONS = [
+    "markdown.extensions.nl2br",
+    "markdown.extensions.tables",
+    "pymdownx.magiclink",
+    "pymdownx.betterem",
+    "pymdownx.tilde",
+    "pymdownx.emoji",
+    "pymdownx.tasklist",
+    "pymdownx.superfences",
+]
+
+# Bump when link rewriting changes what it outputs for the same input
+MARKDOWN_CACHE_VERSION = 1
 
 
 class Templater(object):
     """Build templates."""
 
-    def __init__(self, source_dir: Path, files_as_dirs: bool):
+    def __init__(
+        self, source_dir: Path, files_as_dirs: bool, cache_dir: Optional[Path] = None
+    ):
+        # Times each phase of rendering, when profiling
+        self.timer = PhaseTimer()
+
         self.link_rewriter = LinkRewriterExtension(
             files_as_dirs=files_as_dirs, entrypoint=str(source_dir)
         )
-        self.md = Markdown(
-            extensions=[
-                "markdown.extensions.nl2br",
-                "markdown.extensions.tables",
-                "pymdownx.magiclink",
-                "pymdownx.betterem",
-                "pymdownx.tilde",
-                "pymdownx.emoji",
-                "pymdownx.tasklist",
-                "pymdownx.superfences",
-                self.link_rewriter,
-            ]
+        self.link_rewriter.timer = self.timer
+        # Hashed names of static files, filled in by the build
+        self.fingerprints = Fingerprints()
+        self.link_rewriter.set_fingerprints(self.fingerprints)
+        # Loading the extensions is slow (emoji has a large index), so wait for Markdown
+        self._md: Optional[Markdown] = None
+
+        # Reuse converted Markdown within a build, and between builds if cached
+        self.markdown_cache = MarkdownCache(
+            cache_dir / "markdown" if cache_dir is not None else None,
+            salt=json.dumps(
+                [
+                    MARKDOWN_CACHE_VERSION,
+                    markdown.__version__,
+                    pymdownx.__version__,
+                    MARKDOWN_EXTENSIONS,
+                ]
+            ),
         )
 
+        self.source_dir = source_dir
+        self.cache_dir = cache_dir
+
+        # Parsed data files, shared by every page this templater renders
+        self.data_cache = DataCache()
+        self.data_cache.timer = self.timer
+
+        # Words of the last Markdown page rendered, when building a search index
+        self.collect_search = False
+        self.search_doc: Optional[SearchDoc] = None
+
+        # Every page in the site, filled in by the build
+        self.site = Site(self, source_dir)
+
+        # Set up with the environment when the first template is needed
+        self._jinja: Optional[Environment] = None
+        # Reuse compiled templates from previous builds
+        self.template_cache: Optional[TemplateCache] = None
+
+        # Memoized dependency information, keyed by template name
+        self._template_hashes: dict[str, Optional[str]] = {}
+        self._template_refs: dict[str, tuple[Optional[str], ...]] = {}
+
+    @property
+    def md(self) -> Markdown:
+        if self._md is None:
+            self._md = Markdown(extensions=[*MARKDOWN_EXTENSIONS, self.link_rewriter])
+        return self._md
+
+    @property
+    def jinja(self) -> Environment:
+        if self._jinja is None:
+            self._jinja = self._create_environment()
+        return self._jinja
+
+    def _create_environment(self) -> Environment:
         template_paths: list[Path] = []
 
-        template_dir = source_dir / ".templates"
+        template_dir = self.source_dir / ".templates"
         if template_dir.is_dir():
             template_paths.append(template_dir)
 
@@ -40,63 +114,217 @@ class Templater(object):
         default_template_dir = cur_lib_dir / "default_templates"
         template_paths.append(default_template_dir)
 
-        self.jinja = Environment(loader=FileSystemLoader(template_paths))
-        self.jinja.filters["markdown"] = lambda text: Markup(self.md.convert(text))
-        add_custom_filters(self.jinja.filters)
+        jinja = Environment(loader=FileSystemLoader(template_paths))
+        jinja.filters["markdown"] = self.convert_markdown
+        add_custom_filters(jinja.filters, self.fingerprints.lookup)
+
+        data_dir = DataDirectory(self.data_cache, self.source_dir / "_data")
+        jinja.globals["data"] = data_dir
+        jinja.globals["site"] = self.site
+
+        if self.cache_dir is not None:
+            salt = json.dumps(
+                [
+                    jinja2.__version__,
+                    sorted(jinja.filters.keys()),
+                    sorted(jinja.tests.keys()),
+                ]
+            )
+            self.template_cache = TemplateCache(self.cache_dir / "templates", salt=salt)
+            jinja.bytecode_cache = self.template_cache
+
+        return jinja
+
+    def convert_markdown(self, text: str) -> Markup:
+        """Convert Markdown to HTML."""
+        with self.timer.phase("markdown", len(text)):
+            return Markup(self._convert_markdown(text))
+
+    def _convert_markdown(self, text: str) -> str:
+        rewriter = self.link_rewriter
+        key = self.markdown_cache.get_key(text, rewriter.rewrite_context())
+
+        entry = self.markdown_cache.get(key)
+        if entry is not None and all(
+            rewriter.target_state(target) == state
+            for (target, state) in entry.targets.items()
+        ):
+            # Same text and the links it rewrote still go to the same places
+            rewriter.broken_links.extend(entry.broken_links)
+            rewriter.used_targets.update(entry.targets)
+            return entry.html
+
+        rewriter.take_checked_targets()
+        found_broken = len(rewriter.broken_links)
+        html = self.md.convert(text)
+        targets = rewriter.take_checked_targets()
+        rewriter.used_targets.update(targets)
+        self.markdown_cache.set(
+            key,
+            MarkdownEntry(html, targets, rewriter.broken_links[found_broken:]),
+        )
+        return html
 
     @staticmethod
     def read_metadata(content: str) -> tuple[str, dict[str, object]]:
         """Attempt to read metadata from a file."""
-        post = frontmatter.loads(content)
-        return post.content, post.metadata
+        return parse_frontmatter(content)
+
+    def template_hash(self, name: str) -> Optional[str]:
+        """Hash the source of a loader template, or None if it doesn't exist."""
+        if name not in self._template_hashes:
+            try:
+                (source, _, _) = self.jinja.loader.get_source(self.jinja, name)
+                self._template_hashes[name] = hash_bytes(source.encode("utf-8"))
+            except TemplateNotFound:
+                self._template_hashes[name] = None
+        return self._template_hashes[name]
+
+    def forget_templates(self) -> None:
+        """Drop memoized template information after templates changed on disk."""
+        self._template_hashes.clear()
+        self._template_refs.clear()
+        if self._jinja is not None and self._jinja.cache is not None:
+            # A new template may shadow a cached default one
+            self._jinja.cache.clear()
+
+    def _template_closure(self, names: Iterable[Optional[str]]) -> Optional[set[str]]:
+        """Expand template names to every template they pull in, directly or not."""
+        found: set[str] = set()
+        pending = list(names)
+        while pending:
+            name = pending.pop()
+            if name is None:
+                # Dynamic extends/include, can't be known ahead of time
+                return None
+            if name in found:
+                continue
+            found.add(name)
+
+            if name not in self._template_refs:
+                try:
+                    (source, _, _) = self.jinja.loader.get_source(self.jinja, name)
+                    refs = jinja_meta.find_referenced_templates(
+                        self.jinja.parse(source)
+                    )
+                    self._template_refs[name] = tuple(refs)
+                except TemplateNotFound:
+                    self._template_refs[name] = ()
+            pending.extend(self._template_refs[name])
+        return found
+
+    def find_dependencies(
+        self, content: str, source_filename: Path, is_markdown: bool
+    ) -> tuple[Optional[set[str]], list[Path], dict[str, object]]:
+        """Find the templates and data files a page depends on.
+
+        Templates are None if they can't be determined statically."""
+        (con, meta) = self.read_metadata(content)
+
+        templates = self._template_closure(
+            jinja_meta.find_referenced_templates(self.jinja.parse(con))
+        )
+        if templates is not None:
+            layout: Optional[str] = None
+            if "redirect_url" in meta:
+                layout = "redirect.html"
+            elif is_markdown:
+                layout = "markdown.html"
+                if "template_name" in meta:
+                    layout = "{}.html".format(meta["template_name"])
+            if layout is not None:
+                layout_refs = self._template_closure([layout])
+                templates = None if layout_refs is None else templates | layout_refs
+
+        data_files: list[Path] = []
+        if "load_json" in meta:
+            data_file = source_filename.parent / str(meta["load_json"])
+            data_files.append(Path(os.path.normpath(data_file)))
+
+        return templates, data_files, meta
 
     def render_redirect(self, meta: dict[str, object]) -> str:
-        template = self.jinja.get_template("redirect.html")
-        return template.render(**meta)
+        with self.timer.phase("layout"):
+            template = self.jinja.get_template("redirect.html")
+            return template.render(**meta)
 
-    def generate_string(
+    def prepare_template(
         self, content: str, source_filename: Path, dest_filename: Path, **kwargs
-    ) -> tuple[str, dict[str, object]]:
-        """Generate output given a template string and content."""
-        (con, meta) = self.read_metadata(content)
+    ) -> tuple[Template, dict[str, object], dict[str, object]]:
+        """Compile a template string, returning it with its context and metadata."""
+        with self.timer.phase("frontmatter", len(content)):
+            (con, meta) = self.read_metadata(content)
 
         # Handle load_json
         extra_data = {}
         if "load_json" in meta:
             p = source_filename.parent / str(meta["load_json"])
-            with open(p, "r", encoding="utf-8") as f:
-                extra_data = json.load(f)
+            extra_data = self.data_cache.load(p)
 
         # Update markdown paths
         self.link_rewriter.set_current_filenames(source_filename, dest_filename)
 
-        template = self.jinja.from_string(con)
+        with self.timer.phase("compile"):
+            if self.template_cache is not None:
+                template = self.template_cache.from_string(self.jinja, con)
+            else:
+                template = self.jinja.from_string(con)
         template.filename = str(source_filename)
 
-        return template.render(**kwargs, **meta, **extra_data), meta
+        return template, dict(**kwargs, **meta, **extra_data), meta
 
-    def generate_html(
+    def generate_string(
         self, content: str, source_filename: Path, dest_filename: Path, **kwargs
-    ) -> str:
-        """Generate output given template HTML content."""
-        (con, meta) = self.generate_string(
+    ) -> tuple[str, dict[str, object]]:
+        """Generate output given a template string and content."""
+        (template, context, meta) = self.prepare_template(
+            content, source_filename, dest_filename, **kwargs
+        )
+        with self.timer.phase("render"):
+            return template.render(context), meta
+
+    def _timed_chunks(self, name: str, chunks: Iterator[str]) -> Iterator[str]:
+        """Time producing each chunk as a phase, leaving out whatever consumes it."""
+        if not self.timer.enabled:
+            return chunks
+        return self._time_chunks(name, chunks)
+
+    def _time_chunks(self, name: str, chunks: Iterator[str]) -> Iterator[str]:
+        while True:
+            with self.timer.phase(name):
+                chunk = next(chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+
+    def stream_html(
+        self, content: str, source_filename: Path, dest_filename: Path, **kwargs
+    ) -> Iterator[str]:
+        """Generate output given template HTML content, a piece at a time."""
+        (template, context, meta) = self.prepare_template(
             content, source_filename, dest_filename, **kwargs
         )
         if "redirect_url" in meta:
-            return self.render_redirect(meta)
+            with self.timer.phase("render"):
+                template.render(context)
+            return iter([self.render_redirect(meta)])
 
-        return con
+        return self._timed_chunks("render", template.generate(context))
 
-    def generate_markdown(
+    def stream_markdown(
         self, content: str, source_filename: Path, dest_filename: Path, **kwargs
-    ):
-        """Generate output given template Markdown content."""
+    ) -> Iterator[str]:
+        """Generate output given template Markdown content, a piece at a time."""
         # Convert Markdown to HTML
         (con, meta) = self.generate_string(
             content, source_filename, dest_filename, **kwargs
         )
         if "redirect_url" in meta:
-            return self.render_redirect(meta)
+            return iter([self.render_redirect(meta)])
+
+        if self.collect_search:
+            with self.timer.phase("search", len(con)):
+                self.search_doc = make_search_doc(con, meta)
 
         # Metadata processing
         # Handle template_name
@@ -105,5 +333,24 @@ class Templater(object):
             template_name = "{}.html".format(meta["template_name"])
 
         # Output template as final HTML
-        template = self.jinja.get_template(template_name)
-        return template.render(md_content=con, **kwargs, **meta)
+        with self.timer.phase("layout"):
+            template = self.jinja.get_template(template_name)
+        return self._timed_chunks(
+            "layout", template.generate(md_content=con, **kwargs, **meta)
+        )
+
+    def generate_html(
+        self, content: str, source_filename: Path, dest_filename: Path, **kwargs
+    ) -> str:
+        """Generate output given template HTML content."""
+        return "".join(
+            self.stream_html(content, source_filename, dest_filename, **kwargs)
+        )
+
+    def generate_markdown(
+        self, content: str, source_filename: Path, dest_filename: Path, **kwargs
+    ) -> str:
+        """Generate output given template Markdown content."""
+        return "".join(
+            self.stream_markdown(content, source_filename, dest_filename, **kwargs)
+        )
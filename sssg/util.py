@@ -1,7 +1,16 @@
-from collections.abc import Callable
+import hashlib
+import json
+import os
+import posixpath
+import re
+import threading
+from contextlib import contextmanager
 from pathlib import Path
 from pathmatch import gitmatch
-from typing import Generator, Optional, Iterable
+from typing import IO, Generator, NamedTuple, Optional, Iterable, Iterator
+
+# Output up to this many characters is written in one go, larger output is streamed
+STREAM_BUFFER_SIZE = 1024 * 1024
 
 
 class BuildError(Exception):
@@ -9,6 +18,224 @@ class BuildError(Exception):
         Exception.__init__(self, message)
 
 
+def hash_bytes(data: bytes) -> str:
+    """Hash file contents for change detection."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(path: Path) -> str:
+    """Hash a file for change detection without reading it into memory at once."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def temp_filename_for(dest_filename: Path) -> Path:
+    """Name a temporary file next to a destination, unique to this thread."""
+    return dest_filename.with_name(
+        f".{dest_filename.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+    )
+
+
+@contextmanager
+def atomic_write(
+    dest_filename: Path, mode: str = "wb", encoding: Optional[str] = None
+) -> Iterator[IO]:
+    """Write a file through a temporary one next to it, swapped in when done.
+
+    Readers see either the old file or the new one, never a partial write. If the
+    block raises, the destination is left alone."""
+    temp_filename = temp_filename_for(dest_filename)
+    try:
+        with open(temp_filename, mode, encoding=encoding) as f:
+            yield f
+        os.replace(temp_filename, dest_filename)
+    except BaseException:
+        try:
+            os.remove(temp_filename)
+        except OSError:
+            pass
+        raise
+
+
+def write_if_changed(dest_filename: Path, data: bytes) -> bool:
+    """Atomically replace a file if its contents differ, returning whether it did.
+
+    Unchanged files keep their modification time, so deploys can skip them."""
+    try:
+        if dest_filename.stat().st_size == len(data):
+            with open(dest_filename, "rb") as f:
+                if f.read() == data:
+                    return False
+    except OSError:
+        # Doesn't exist yet, or can't be read, write it either way
+        pass
+
+    with atomic_write(dest_filename) as f:
+        f.write(data)
+    return True
+
+
+def _take_text(chunks: Iterator[str], size: int) -> str:
+    """Join chunks until they add up to more than size characters, or run out."""
+    pending: list[str] = []
+    total = 0
+    for chunk in chunks:
+        pending.append(chunk)
+        total = total + len(chunk)
+        if total > size:
+            break
+    return "".join(pending)
+
+
+def write_chunks_if_changed(
+    dest_filename: Path, chunks: Iterable[str], buffer_size: int = STREAM_BUFFER_SIZE
+) -> bool:
+    """Like write_if_changed, for text produced a piece at a time.
+
+    Output up to buffer_size characters is written in one go. Anything bigger is
+    written to a temporary file about buffer_size characters at a time, so memory
+    use stays the same however big the output gets."""
+    it = iter(chunks)
+    text = _take_text(it, buffer_size)
+    if len(text) <= buffer_size:
+        # That's all of it
+        return write_if_changed(dest_filename, text.encode("utf-8"))
+
+    digest = hashlib.sha256()
+    written = 0
+    temp_filename = temp_filename_for(dest_filename)
+    try:
+        with open(temp_filename, "wb") as f:
+            while text:
+                data = text.encode("utf-8")
+                digest.update(data)
+                written = written + f.write(data)
+                text = _take_text(it, buffer_size)
+
+        try:
+            unchanged = (
+                dest_filename.stat().st_size == written
+                and hash_file(dest_filename) == digest.hexdigest()
+            )
+        except OSError:
+            unchanged = False
+        if unchanged:
+            os.remove(temp_filename)
+            return False
+
+        os.replace(temp_filename, dest_filename)
+    except BaseException:
+        try:
+            os.remove(temp_filename)
+        except OSError:
+            pass
+        raise
+    return True
+
+
+class StatCache(object):
+    """Values worked out from files, reused while a file's size and mtime match.
+
+    Saved as JSON with [size, mtime_ns, value] by relative path under key, next to
+    any other fields given. The last save is only loaded if those fields match.
+    Entries not looked up or set since are dropped when saving. Safe to use from
+    several threads."""
+
+    def __init__(
+        self,
+        state_filename: Optional[Path] = None,
+        key: str = "files",
+        fields: Optional[dict[str, object]] = None,
+    ):
+        self.state_filename = state_filename
+        self.key = key
+        self.fields = fields or {}
+
+        self.previous: dict[str, list] = {}
+        if state_filename is not None:
+            try:
+                with open(state_filename, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if (
+                    isinstance(data, dict)
+                    and isinstance(data.get(key), dict)
+                    and all(data.get(k) == v for (k, v) in self.fields.items())
+                ):
+                    self.previous = data[key]
+            except (OSError, ValueError):
+                pass
+        self.entries: dict[str, list] = {}
+        self.lock = threading.Lock()
+
+    def __getstate__(self) -> dict[str, object]:
+        # Locks can't be sent to other processes, they get their own
+        return dict(self.__dict__, lock=None)
+
+    def __setstate__(self, state: dict[str, object]) -> None:
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def get(self, rel_path: str, st: os.stat_result) -> Optional[object]:
+        """Get the value for a file if it's unchanged since it was set."""
+        with self.lock:
+            entry = self.entries.get(rel_path) or self.previous.get(rel_path)
+            if entry is not None and entry[:2] == [st.st_size, st.st_mtime_ns]:
+                self.entries[rel_path] = entry
+                return entry[2]
+        return None
+
+    def get_previous(self, rel_path: str) -> Optional[object]:
+        """Get the value for a file from the last save, even if it changed since."""
+        entry = self.previous.get(rel_path)
+        return entry[2] if entry is not None else None
+
+    def set(self, rel_path: str, st: os.stat_result, value: object) -> None:
+        """Remember the value for a file as it is now."""
+        with self.lock:
+            self.entries[rel_path] = [st.st_size, st.st_mtime_ns, value]
+
+    def save(self) -> None:
+        """Keep the entries for the next build."""
+        if self.state_filename is None:
+            return
+        data = dict(self.fields)
+        data[self.key] = self.entries
+        self.state_filename.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.state_filename, "w", encoding="utf-8") as f:
+            json.dump(data, f, sort_keys=True)
+
+
+class SourceIndex(object):
+    """Relative paths of the source files and their directories, kept in memory."""
+
+    def __init__(self, source_dir: Path, files: Iterable[Path] = ()):
+        self.source_dir = source_dir
+        self.files: set[str] = set()
+        self.dirs: set[str] = {"."}
+        for path in files:
+            self.add(path)
+
+    def add(self, path: Path) -> None:
+        """Add a source file and its parent directories."""
+        rel_path = path.relative_to(self.source_dir).as_posix()
+        self.files.add(rel_path)
+
+        parent = posixpath.dirname(rel_path)
+        while parent and parent not in self.dirs:
+            self.dirs.add(parent)
+            parent = posixpath.dirname(parent)
+
+    def discard(self, path: Path) -> None:
+        """Remove a source file, keeping its directories."""
+        self.files.discard(path.relative_to(self.source_dir).as_posix())
+
+    def __contains__(self, rel_path: str) -> bool:
+        return rel_path in self.files or rel_path in self.dirs
+
+
 def restructure_file_as_dir(
     files_as_dirs: bool, current_path: Path, current_height=0, new_filename="index.html"
 ) -> tuple[Path, str]:
@@ -29,45 +256,103 @@ def restructure_file_as_dir(
         # Don't continue
         return current_path, ptr
 
-    target_dir = basedir / filename
-    if not target_dir.exists():
-        target_dir.mkdir()
+    return basedir / filename / new_filename, ptr
+
 
-    return target_dir / new_filename, ptr
+def map_output_path(
+    source_dir: Path, dest_dir: Path, source_filename: Path, files_as_dirs: bool
+) -> tuple[Path, str]:
+    """Find where a source file ends up in the destination without touching the disk.
 
+    Also returns the relative path from a page back to the root."""
 
-def find_files(
+    pp = source_filename.parts[len(source_dir.parts) :]
+    dest_filename = Path(dest_dir, *pp)
+
+    if source_filename.suffix == ".j2" or source_filename.suffix == ".md":
+        dest_filename = dest_filename.with_suffix("")
+        if ".md" in source_filename.suffixes:
+            # Markdown templates turn into HTML
+            dest_filename = dest_filename.with_suffix(".html")
+        return restructure_file_as_dir(files_as_dirs, dest_filename, len(pp))
+    elif source_filename.suffix == ".sssg-copy":
+        return dest_filename.with_suffix(""), ""
+
+    return dest_filename, ""
+
+
+class IgnoreMatcher(object):
+    """Match paths against gitignore style globs, all compiled into one regex."""
+
+    def __init__(self, patterns: Optional[Iterable[str]] = None):
+        regexes = [gitmatch.translate(p) for p in (patterns or []) if p]
+        self.regex: Optional[re.Pattern[str]] = None
+        if regexes:
+            self.regex = re.compile("|".join(f"(?:{r.pattern})" for r in regexes))
+
+    def match(self, relative_file: str) -> bool:
+        """Check if a file (like "/dir/file.txt") is ignored."""
+        return self.regex is not None and self.regex.match(relative_file) is not None
+
+    def match_dir(self, relative_dir: str) -> bool:
+        """Check if everything in a directory (like "/dir") is ignored."""
+        return self.regex is not None and (
+            self.regex.match(relative_dir) is not None
+            or self.regex.match(relative_dir + "/") is not None
+        )
+
+
+class SourceFile(NamedTuple):
+    """A file found in the source directory, with the stat data from the walk."""
+
+    path: Path
+    relative_file: str
+    stat: os.stat_result
+
+
+def walk_source(
     start_dir: Path,
     ignore_paths: Optional[Iterable[str]] = None,
     relative_path: str = "",
-) -> Generator[Path, None, None]:
-    """Find files in the source directory."""
+) -> Generator[SourceFile, None, None]:
+    """Find files in the source directory, skipping ignored directories entirely."""
 
-    ignore_these: list[Callable[[str], bool]] = []
-    if ignore_paths is not None:
-        if not isinstance(ignore_paths, list):
-            # Coerce to list
-            ignore_paths = list(ignore_paths)
+    matcher = IgnoreMatcher(ignore_paths)
+    yield from _walk_source_dir(Path(start_dir), matcher, relative_path)
 
-        # Construct matchers
-        ignore_these = [(lambda fn: gitmatch.match(p, fn)) for p in ignore_paths]
 
-    for entry in Path(start_dir).iterdir():
+def _walk_source_dir(
+    start_dir: Path, matcher: IgnoreMatcher, relative_path: str
+) -> Generator[SourceFile, None, None]:
+    with os.scandir(start_dir) as it:
+        entries = list(it)
+
+    for entry in entries:
         relative_file = relative_path + "/" + entry.name
 
         if entry.is_file():
             # Handle ignore paths
-            if any(i(relative_file) for i in ignore_these):
+            if matcher.match(relative_file):
                 # Skip this entry
                 continue
 
-            yield entry
-        if (
-            entry.is_dir()
-            and entry.name != "."
-            and entry.name != ".."
-            and entry.name != ".templates"
-        ):
-            yield from find_files(
-                entry, ignore_paths=ignore_paths, relative_path=relative_file
+            yield SourceFile(start_dir / entry.name, relative_file, entry.stat())
+        elif entry.is_dir() and entry.name != ".templates":
+            if matcher.match_dir(relative_file):
+                # Nothing in here can be included
+                continue
+
+            yield from _walk_source_dir(
+                start_dir / entry.name, matcher, relative_file
             )
+
+
+def find_files(
+    start_dir: Path,
+    ignore_paths: Optional[Iterable[str]] = None,
+    relative_path: str = "",
+) -> Generator[Path, None, None]:
+    """Find files in the source directory."""
+
+    for source_file in walk_source(start_dir, ignore_paths, relative_path):
+        yield source_file.path
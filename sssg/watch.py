@@ -0,0 +1,293 @@
+import os
+import stat
+import threading
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+from . import process_directory, process_file
+from .manifest import BuildManifest
+from .plan import BuildPlan, plan_file
+from .site import SITE_STATE_FILENAME, PageIndexCache, index_pages
+from .sinks import DirectorySink
+from .templater import Templater
+from .util import hash_bytes, walk_source, SourceIndex, BuildError
+from .workers import build_page
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    """Serve the destination without logging every request."""
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_directory(
+    dest_path: Path, port: int, debug: bool = False
+) -> ThreadingHTTPServer:
+    """Serve a directory over HTTP from a background thread."""
+
+    handler = partial(
+        SimpleHTTPRequestHandler if debug else QuietHandler, directory=str(dest_path)
+    )
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+class SiteWatcher(object):
+    """Keep a warm templater and rebuild only what changed in the source."""
+
+    def __init__(
+        self,
+        source_dir: str,
+        dest_dir: str,
+        files_as_dirs: bool = False,
+        ignore_paths: Optional[list[str]] = None,
+        debug: bool = False,
+        cache_dir: Optional[str] = None,
+    ):
+        # Normalized like the data files pages depend on, so changes match them
+        self.source_path = Path(os.path.abspath(source_dir))
+        self.dest_path = Path(os.path.abspath(dest_dir))
+        self.sink = DirectorySink(self.dest_path)
+        self.template_dir = self.source_path / ".templates"
+        self.data_dir = self.source_path / "_data"
+        self.files_as_dirs = files_as_dirs
+        self.ignore_paths = ignore_paths
+        self.debug = debug
+
+        cache_path = Path(cache_dir).absolute() if cache_dir else None
+        self.tmpl = Templater(self.source_path, files_as_dirs, cache_path)
+        self.manifest = BuildManifest.load(
+            self.dest_path, {"files_as_dirs": files_as_dirs}
+        )
+        self.snapshot = self.scan()
+
+        # Resolve Markdown links against the files seen while polling
+        self.source_index = SourceIndex(
+            self.source_path,
+            (p for p in self.snapshot if self.is_page_or_asset(p)),
+        )
+        self.tmpl.link_rewriter.set_source_index(self.source_index)
+
+        # Frontmatter of every page for site.pages, where the first build left it
+        self.page_cache = PageIndexCache(
+            cache_path / "site.json"
+            if cache_path is not None
+            else self.dest_path / SITE_STATE_FILENAME
+        )
+        self.refresh_site()
+
+    def refresh_site(self) -> None:
+        """Index the pages in the source again, rereading only changed ones."""
+        # The last scan already walked the source
+        entries = [
+            plan_file(self.source_path, self.dest_path, path, self.files_as_dirs)
+            for path in self.snapshot
+            if self.is_page_or_asset(path)
+        ]
+        plan = BuildPlan(
+            self.source_path,
+            self.dest_path,
+            self.files_as_dirs,
+            tuple(e for e in entries if e.is_page),
+        )
+        self.tmpl.site.update(
+            index_pages(plan, Templater.read_metadata, self.page_cache)
+        )
+
+    def is_page_or_asset(self, path: Path) -> bool:
+        """Check if a source file is built itself, not just used by templates."""
+        return path in self.built_files
+
+    def warm_up(self) -> None:
+        """Compile every layout the site uses ahead of the first change."""
+        names: set[str] = set()
+        for entry in self.manifest.pages.values():
+            if entry["templates"] is not None:
+                names.update(entry["templates"])
+        for name in sorted(names):
+            try:
+                self.tmpl.jinja.get_template(name)
+            except Exception:
+                # The page will report it when it gets rebuilt
+                pass
+
+    def scan(self) -> dict[Path, tuple[int, int]]:
+        """Record the modification time and size of every source file."""
+        found: dict[Path, tuple[int, int]] = {}
+
+        for source_file in walk_source(self.source_path, self.ignore_paths):
+            if source_file.path.is_relative_to(self.dest_path):
+                # Don't rebuild because of our own output
+                continue
+            st = source_file.stat
+            found[source_file.path] = (st.st_mtime_ns, st.st_size)
+        # The rest are only used by templates, like ignored _data files
+        self.built_files = set(found.keys())
+
+        for directory in (self.template_dir, self.data_dir):
+            if not directory.is_dir():
+                continue
+            for path in directory.rglob("*"):
+                try:
+                    st = path.stat()
+                except OSError:
+                    continue
+                if stat.S_ISREG(st.st_mode):
+                    found[path] = (st.st_mtime_ns, st.st_size)
+
+        return found
+
+    def poll(self) -> int:
+        """Rebuild anything that changed since the last poll.
+
+        Returns the number of files rebuilt."""
+        current = self.scan()
+        changed = {p for (p, s) in current.items() if self.snapshot.get(p) != s}
+        removed = set(self.snapshot.keys()) - set(current.keys())
+        self.snapshot = current
+
+        if not changed and not removed:
+            return 0
+        return self.rebuild(changed, removed)
+
+    def rebuild(self, changed: set[Path], removed: set[Path]) -> int:
+        """Rebuild changed files and every page depending on them."""
+        touched = changed | removed
+
+        template_names = {
+            p.relative_to(self.template_dir).as_posix()
+            for p in touched
+            if p.is_relative_to(self.template_dir)
+        }
+        if template_names:
+            self.tmpl.forget_templates()
+        self.manifest.forget_data(touched)
+        try:
+            self.refresh_site()
+        except (BuildError, OSError) as err:
+            # Keep the last index until the writer fixes the page
+            print(err)
+
+        for path in removed:
+            rel_path = path.relative_to(self.source_path).as_posix()
+            self.manifest.pages.pop(rel_path, None)
+            self.source_index.discard(path)
+        for path in changed:
+            if self.is_page_or_asset(path):
+                self.source_index.add(path)
+
+        # Keep the order stable, and build each file once
+        to_build: dict[Path, None] = {}
+        for path in sorted(changed):
+            if self.is_page_or_asset(path):
+                to_build[path] = None
+        for rel_path in self.manifest.dependents(template_names, touched):
+            to_build[self.source_path / rel_path] = None
+        for rel_path in self.manifest.site_dependents(self.tmpl):
+            to_build[self.source_path / rel_path] = None
+        for rel_path in self.manifest.link_dependents(self.tmpl):
+            to_build[self.source_path / rel_path] = None
+
+        built = 0
+        for path in to_build:
+            if not path.is_file():
+                continue
+            if self.debug:
+                print(f" > {path}")
+            try:
+                self.build_file(path)
+                built = built + 1
+            except (BuildError, OSError) as err:
+                # Keep watching, the writer will fix it and save again
+                print(err)
+
+        return built
+
+    def build_file(self, path: Path) -> None:
+        """Build a single source file with the warm templater."""
+        task = process_file(
+            self.source_path, self.dest_path, path, self.files_as_dirs, sink=self.sink
+        )
+        if task is None:
+            return
+
+        with open(path, "rb") as f:
+            source_hash = hash_bytes(f.read())
+
+        result = build_page(self.tmpl, task, True, self.sink)
+        self.manifest.record(task.rel_path, source_hash, task.dest, self.tmpl, result)
+        for href in result.broken_links:
+            print(" > In", path, "link to", href, "not found.")
+
+    def close(self) -> None:
+        """Save what was learned about the site for the next build."""
+        self.manifest.save()
+        self.page_cache.save()
+        if self.tmpl.template_cache is not None:
+            self.tmpl.template_cache.prune()
+        self.tmpl.markdown_cache.prune()
+
+
+def watch_directory(
+    source_dir: str,
+    dest_dir: str,
+    files_as_dirs: bool = False,
+    wipe_first: bool = False,
+    ignore_paths: Optional[list[str]] = None,
+    debug: bool = False,
+    jobs: int = 1,
+    cache_dir: Optional[str] = None,
+    port: int = 8000,
+    interval: float = 0.1,
+) -> None:
+    """Build a source directory, then serve it and rebuild on changes until stopped."""
+
+    # Start from an up to date build with known dependencies
+    process_directory(
+        source_dir,
+        dest_dir,
+        files_as_dirs=files_as_dirs,
+        wipe_first=wipe_first,
+        ignore_paths=ignore_paths,
+        debug=debug,
+        incremental=True,
+        jobs=jobs,
+        cache_dir=cache_dir,
+    )
+
+    watcher = SiteWatcher(
+        source_dir,
+        dest_dir,
+        files_as_dirs=files_as_dirs,
+        ignore_paths=ignore_paths,
+        debug=debug,
+        cache_dir=cache_dir,
+    )
+    watcher.warm_up()
+
+    server = serve_directory(watcher.dest_path, port, debug)
+    print(f"Serving on http://127.0.0.1:{server.server_port}/, watching for changes.")
+
+    try:
+        while True:
+            time.sleep(interval)
+            start = time.perf_counter()
+            try:
+                built = watcher.poll()
+            except OSError as err:
+                # A file went away mid-save, the next poll sees how it ended up
+                print(err)
+                continue
+            if built:
+                elapsed = (time.perf_counter() - start) * 1000
+                print(f"Rebuilt {built} file(s) in {elapsed:.0f}ms.")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        watcher.close()
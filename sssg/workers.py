@@ -0,0 +1,167 @@
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Iterable,
+    Iterator,
+    NamedTuple,
+    Optional,
+    Union,
+)
+from .profiling import PhaseTimings
+from .search import SearchDoc
+from .site import PageRecord
+from .sinks import OutputSink
+from .util import SourceIndex, BuildError
+
+if TYPE_CHECKING:
+    from .templater import Templater
+
+
+class PageTask(NamedTuple):
+    """A template or Markdown page to render."""
+
+    source: Path
+    dest: Path
+    dest_rel: str
+    rel_path: str
+    path_to_root: str
+    is_markdown: bool
+
+
+class PageResult(NamedTuple):
+    """The rendered output of a page, plus its dependencies if requested.
+
+    output is None if the page was streamed straight into a sink."""
+
+    output: Optional[str]
+    broken_links: list[str]
+    timings: PhaseTimings
+    templates: Optional[set[str]]
+    data_files: list[Path]
+    # Fingerprinted paths looked up, None for files that weren't fingerprinted
+    assets: dict[str, Optional[str]]
+    # Hashes of the site index ("") and other pages' sources used
+    site: dict[str, Optional[str]]
+    # Markdown link targets checked, with their fingerprinted path or if they exist
+    targets: dict[str, Union[str, bool]]
+    meta: dict[str, object]
+    # Words for the search index, for Markdown pages when collecting them
+    search: Optional[SearchDoc] = None
+
+
+def _count_chunks(chunks: Iterable[str], total: list[int]) -> Iterator[str]:
+    """Pass chunks through, adding up their length in total[0]."""
+    for chunk in chunks:
+        total[0] = total[0] + len(chunk)
+        yield chunk
+
+
+def build_page(
+    tmpl: "Templater",
+    task: PageTask,
+    find_deps: bool = False,
+    sink: Optional[OutputSink] = None,
+) -> PageResult:
+    """Render a page without writing it anywhere, or streamed into a sink."""
+
+    # Drop anything left over from a page that failed
+    tmpl.timer.take()
+    tmpl.link_rewriter.take_broken_links()
+    tmpl.link_rewriter.take_used_targets()
+    tmpl.data_cache.take_used()
+    tmpl.fingerprints.take_used()
+    tmpl.site.take_used()
+    tmpl.search_doc = None
+
+    try:
+        with tmpl.timer.phase("read"):
+            with open(task.source, "r", encoding="utf-8") as f:
+                content = f.read()
+        tmpl.timer.add("read", 0, len(content))
+
+        if task.is_markdown:
+            chunks = tmpl.stream_markdown(
+                content, task.source, task.dest, path_to_root=task.path_to_root
+            )
+        else:
+            chunks = tmpl.stream_html(
+                content, task.source, task.dest, path_to_root=task.path_to_root
+            )
+
+        output: Optional[str] = None
+        if sink is not None:
+            # Rendering is timed separately as the chunks are produced
+            written = [0]
+            with tmpl.timer.phase("write"):
+                sink.write_chunks(task.dest_rel, _count_chunks(chunks, written))
+            tmpl.timer.add("write", 0, written[0])
+        else:
+            output = "".join(chunks)
+    except Exception as err:
+        kind = "markdown" if task.is_markdown else "template"
+        raise BuildError(
+            f"Failed processing {kind} file: /{task.rel_path}, got error: {err}"
+        ) from err
+
+    broken_links = tmpl.link_rewriter.take_broken_links()
+    (search, tmpl.search_doc) = (tmpl.search_doc, None)
+    if not find_deps:
+        return PageResult(
+            output, broken_links, tmpl.timer.take(), None, [], {}, {}, {}, {}, search
+        )
+
+    (templates, data_files, meta) = tmpl.find_dependencies(
+        content, task.source, task.is_markdown
+    )
+    # Include _data files the templates looked up while rendering
+    data_files = sorted(set(data_files).union(tmpl.data_cache.take_used()))
+    return PageResult(
+        output,
+        broken_links,
+        tmpl.timer.take(),
+        templates,
+        data_files,
+        tmpl.fingerprints.take_used(),
+        tmpl.site.take_used(),
+        tmpl.link_rewriter.take_used_targets(),
+        meta,
+        search,
+    )
+
+
+# Each worker process gets its own templater, set up once by the pool
+_worker_tmpl: Optional["Templater"] = None
+
+
+def init_worker(
+    source_dir: Path,
+    files_as_dirs: bool,
+    cache_dir: Optional[Path],
+    source_index: SourceIndex,
+    profile: bool,
+    fingerprints: Optional[dict[str, str]] = None,
+    pages: Union[list[PageRecord], Callable[[], list[PageRecord]], None] = None,
+    search: bool = False,
+) -> None:
+    """Prepare a templater for this worker process.
+
+    pages can be a function listing them, called when a page first uses them."""
+    from .templater import Templater
+
+    global _worker_tmpl
+    _worker_tmpl = Templater(source_dir, files_as_dirs, cache_dir)
+    _worker_tmpl.link_rewriter.set_source_index(source_index)
+    _worker_tmpl.fingerprints.update(fingerprints or {})
+    _worker_tmpl.site.update(pages or [])
+    _worker_tmpl.collect_search = search
+    _worker_tmpl.timer.enabled = profile
+
+
+def build_page_in_worker(
+    task: PageTask, find_deps: bool, sink: Optional[OutputSink] = None
+) -> PageResult:
+    """Render a page using this worker process's templater."""
+    if _worker_tmpl is None:
+        raise BuildError("Worker process was not initialized")
+    return build_page(_worker_tmpl, task, find_deps, sink)
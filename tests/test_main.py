@@ -0,0 +1,47 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+REPO_DIR = Path(__file__).absolute().parent.parent
+
+
+def run_sssg(*args, cwd):
+    return subprocess.run(
+        [sys.executable, "-m", "sssg", *args],
+        cwd=cwd,
+        env=dict(os.environ, PYTHONPATH=str(REPO_DIR)),
+        capture_output=True,
+        text=True,
+    )
+
+
+def test_source_named_merge(tmp_path):
+    (tmp_path / "merge").mkdir()
+    (tmp_path / "merge" / "style.css").write_text("body {}")
+
+    result = run_sssg("merge", "out", cwd=tmp_path)
+    assert result.returncode == 0, result.stderr
+    assert (tmp_path / "out" / "style.css").read_text() == "body {}"
+
+
+def test_merge_shards(tmp_path):
+    (tmp_path / "src").mkdir()
+    for name in ("a.css", "b.css", "c.css"):
+        (tmp_path / "src" / name).write_text(name)
+
+    for shard in ("1/2", "2/2"):
+        out = f"out{shard[0]}"
+        result = run_sssg("--shard", shard, "src", out, cwd=tmp_path)
+        assert result.returncode == 0, result.stderr
+
+    result = run_sssg("--merge", "out1,out2", "site", cwd=tmp_path)
+    assert result.returncode == 0, result.stderr
+    for name in ("a.css", "b.css", "c.css"):
+        assert (tmp_path / "site" / name).read_text() == name
+
+
+def test_merge_without_source(tmp_path):
+    result = run_sssg("--merge", "out1,out2", "src", "site", cwd=tmp_path)
+    assert result.returncode == 2
+    assert "--merge only takes a destination" in result.stderr
@@ -0,0 +1,16 @@
+import subprocess
+import sys
+
+
+def test_public_names():
+    from sssg import BuildError, Templater, find_files, restructure_file_as_dir
+
+    assert Templater.__name__ == "Templater"
+    assert callable(find_files) and callable(restructure_file_as_dir)
+    assert issubclass(BuildError, Exception)
+
+
+def test_import_leaves_templater_unloaded():
+    code = "import sys, sssg; print('jinja2' in sys.modules)"
+    output = subprocess.check_output([sys.executable, "-c", code], text=True)
+    assert output.strip() == "False"
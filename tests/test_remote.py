@@ -0,0 +1,27 @@
+import socket
+import pytest
+from sssg import process_directory
+from sssg.util import BuildError
+
+
+@pytest.fixture
+def stalled_url():
+    # Accepts connections, then never answers
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(8)
+    yield f"http://127.0.0.1:{server.getsockname()[1]}/file"
+    server.close()
+
+
+@pytest.mark.parametrize("use_cache", [False, True])
+def test_stalled_download_times_out(tmp_path, stalled_url, use_cache):
+    source = tmp_path / "src"
+    source.mkdir()
+    (source / "file.bin.sssg-copy").write_text(stalled_url)
+
+    cache_dir = str(tmp_path / "cache") if use_cache else None
+    with pytest.raises(BuildError, match=f"Timed out downloading {stalled_url}"):
+        process_directory(
+            str(source), str(tmp_path / "out"), cache_dir=cache_dir, fetch_timeout=0.2
+        )
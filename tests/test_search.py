@@ -0,0 +1,38 @@
+import pytest
+from sssg import process_directory
+
+
+def write_site(source):
+    source.mkdir()
+    (source / "a.md").write_text("---\ntitle: Alpha\n---\nzebra quokka\n")
+    (source / "b.md").write_text("---\ntitle: Beta\n---\nyak\n")
+
+
+def shard_mtimes(search_dir):
+    return {p.name: p.stat().st_mtime_ns for p in search_dir.iterdir()}
+
+
+def test_prune_keeps_shards_with_leading_slash(tmp_path):
+    source = tmp_path / "src"
+    dest = tmp_path / "out"
+    write_site(source)
+
+    options = {"incremental": True, "prune": True, "search_index": "/search/"}
+    process_directory(str(source), str(dest), **options)
+    before = shard_mtimes(dest / "search")
+    assert "ze.json" in before
+
+    # Only the shards with changed words are written again
+    (source / "b.md").write_text("---\ntitle: Beta\n---\nyak yodel\n")
+    process_directory(str(source), str(dest), **options)
+    after = shard_mtimes(dest / "search")
+    assert after["ze.json"] == before["ze.json"]
+    assert after["al.json"] == before["al.json"]
+    assert "yo.json" in after
+
+
+def test_search_index_outside_destination(tmp_path):
+    source = tmp_path / "src"
+    write_site(source)
+    with pytest.raises(ValueError):
+        process_directory(str(source), str(tmp_path / "out"), search_index="../up")
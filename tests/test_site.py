@@ -0,0 +1,36 @@
+import json
+import pytest
+from sssg import process_directory
+
+
+def write_site(source, listing):
+    (source / "blog").mkdir(parents=True)
+    (source / "blog" / "a.md").write_text("---\ntitle: First\n---\nHello\n")
+    (source / "blog" / "b.md").write_text("---\ntitle: Second\n---\nThere\n")
+    (source / "index.html.j2").write_text(listing)
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_site_pages(tmp_path, jobs):
+    source = tmp_path / "src"
+    write_site(source, "{% for p in site.pages %}{{ p.title }};{% endfor %}")
+    process_directory(str(source), str(tmp_path / "out"), jobs=jobs)
+    assert (tmp_path / "out" / "index.html").read_text() == "First;Second;;"
+
+
+def phases(profile):
+    with open(profile, "r", encoding="utf-8") as f:
+        return json.load(f)["phases"]
+
+
+def test_site_pages_only_read_when_used(tmp_path):
+    source = tmp_path / "src"
+    profile = tmp_path / "profile.json"
+    write_site(source, "No listing")
+    process_directory(str(source), str(tmp_path / "out"), profile=str(profile))
+    assert "index" not in phases(profile)
+
+    (source / "index.html.j2").write_text("{{ site.pages | length }}")
+    process_directory(str(source), str(tmp_path / "out"), profile=str(profile))
+    assert "index" in phases(profile)
+    assert (tmp_path / "out" / "index.html").read_text() == "3"
@@ -0,0 +1,19 @@
+from sssg import process_directory
+from sssg.watch import SiteWatcher
+
+
+def test_rebuild_data_dependents_through_dotdot(tmp_path, monkeypatch):
+    source = tmp_path / "src"
+    (source / "_data").mkdir(parents=True)
+    (source / "_data" / "site.json").write_text('{"title": "Old"}')
+    (source / "page.html.j2").write_text("{{ data.site.title }}")
+    (tmp_path / "work").mkdir()
+    monkeypatch.chdir(tmp_path / "work")
+
+    process_directory("../src", "../out", incremental=True)
+    watcher = SiteWatcher("../src", "../out")
+    (source / "_data" / "site.json").write_text('{"title": "Newer"}')
+    watcher.poll()
+    watcher.close()
+
+    assert (tmp_path / "out" / "page.html").read_text() == "Newer"